@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from . import authentication  # noqa: F401  (signal receivers)
+        from . import checks  # noqa: F401  (system checks)
+        from . import db  # noqa: F401  (connection metrics)
@@ -0,0 +1,76 @@
+"""
+Stateless JWT authentication (opt in with JWT_STATELESS_AUTH).
+
+The default JWTAuthentication loads the User row on every request.
+StatelessJWTAuthentication builds request.user from the access token's
+claims instead; LoginSerializer.get_token embeds the ones views use.
+The state it still needs, whether the account is active and its
+is_staff / is_superuser flags, comes from a small TTL cache that is
+cleared whenever the user is saved or deleted. Privileges are never
+taken from the token: a claim would survive a demotion for as long as
+the holder keeps refreshing.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+User = get_user_model()
+
+
+class ClaimsUser(TokenUser):
+    """
+    TokenUser whose id has the same type as User.pk, so request.user.id
+    is interchangeable between the two authentication modes, and whose
+    is_staff / is_superuser come from the account, not from the token.
+    """
+
+    def __init__(self, token, is_staff=False, is_superuser=False):
+        super().__init__(token)
+        self.is_staff = is_staff
+        self.is_superuser = is_superuser
+
+    @cached_property
+    def id(self):
+        return User._meta.pk.to_python(self.token[api_settings.USER_ID_CLAIM])
+
+
+class StatelessJWTAuthentication(JWTStatelessUserAuthentication):
+
+    def get_user(self, validated_token):
+        super().get_user(validated_token)  # validates the user id claim
+        user_id = User._meta.pk.to_python(validated_token[api_settings.USER_ID_CLAIM])
+        flags = account_flags(user_id)
+        if flags is None:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return ClaimsUser(validated_token, *flags)
+
+
+def _account_key(user_id):
+    return f"auth:account:{user_id}"
+
+
+def account_flags(user_id):
+    """
+    (is_staff, is_superuser) of user_id, or None unless it is an
+    existing, active account. Cached for JWT_ACTIVE_CACHE_TTL seconds.
+    """
+    key = _account_key(user_id)
+    flags = cache.get(key)
+    if flags is None:
+        row = User.objects.filter(pk=user_id, is_active=True).values_list("is_staff", "is_superuser").first()
+        flags = tuple(row) if row else ()  # () caches "inactive or deleted"
+        cache.set(key, flags, settings.JWT_ACTIVE_CACHE_TTL)
+    return tuple(flags) or None
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_account_flags(sender, instance, **kwargs):
+    cache.delete(_account_key(instance.pk))
@@ -0,0 +1,49 @@
+"""
+Authentication backends.
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.functions import Lower
+
+UserModel = get_user_model()
+
+
+class UsernameOrEmailBackend(ModelBackend):
+    """
+    ModelBackend that accepts a username or an email address (case
+    insensitive) in the username field.
+
+    The account is resolved with one query that uses the username
+    index and the LOWER(email) index (core migration 0009), and the
+    password is hashed exactly once. An exact username match wins over
+    an email match; an email shared by several accounts matches none.
+    Unknown logins still pay one hash, so response times do not reveal
+    which accounts exist.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        candidates = list(
+            UserModel._default_manager
+            .alias(email_lower=Lower("email"))
+            .filter(Q(**{UserModel.USERNAME_FIELD: username}) | Q(email_lower=username.lower()))
+            .annotate(username_match=Case(
+                When(**{UserModel.USERNAME_FIELD: username}, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            ))
+            .order_by("username_match")[:2]
+        )
+        if candidates and (candidates[0].username_match == 0 or len(candidates) == 1):
+            user = candidates[0]
+            if user.check_password(password) and self.user_can_authenticate(user):
+                return user
+            return None
+        # Same cost as a real check (see ModelBackend.authenticate).
+        UserModel().set_password(password)
+        return None
@@ -0,0 +1,225 @@
+"""
+Response cache for TMDb calls.
+
+Values are stored as JSON bytes in a backend (in-process LRU or Redis)
+with a TTL chosen per TMDb endpoint. Concurrent misses on the same key
+are coalesced so only one caller requests TMDb while the others wait
+for its result.
+"""
+import asyncio
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from . import metrics
+from .coalesce import Coalescer
+
+
+class LocMemBackend:
+    """
+    In-process LRU cache bounded by the total size of the stored values.
+    """
+    blocking = False  # safe to call from the event loop
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._size += len(value)
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._data)))
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._size = 0
+
+    def _remove(self, key):
+        _, value = self._data.pop(key)
+        self._size -= len(value)
+
+
+class RedisBackend:
+    """
+    Stores values in Redis. Any client with the redis-py get/set/delete
+    API works, which keeps it testable with an in-memory fake.
+    """
+    blocking = True  # network I/O, run off the event loop
+
+    def __init__(self, client, prefix="tmdb:"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured(
+                "TMDB_CACHE_BACKEND=redis needs the redis package (pip install redis)."
+            )
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value, ex=max(1, int(ttl)))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+
+# (pattern on the TMDb path, name of the TTL in TMDB_CACHE['TTLS'])
+ENDPOINT_TTLS = [
+    (re.compile(r"^/movie/(popular|top_rated|now_playing|upcoming)$"), "popular"),
+    (re.compile(r"^/movie/\d+"), "movie"),
+]
+
+
+class TMDbCache:
+    """
+    JSON cache in front of TMDb with per-endpoint TTLs. Concurrent calls
+    for the same normalized URL share one upstream request (see
+    core.coalesce), whether the endpoint is cached or not.
+    """
+
+    def __init__(self, backend, ttls):
+        self.backend = backend
+        self.ttls = ttls
+        self.coalescer = Coalescer("tmdb")
+
+    def ttl_for(self, path):
+        for pattern, name in ENDPOINT_TTLS:
+            if pattern.match(path):
+                return self.ttls.get(name, self.ttls.get("default", 0))
+        return self.ttls.get("default", 0)
+
+    @staticmethod
+    def make_key(path, params):
+        query = "&".join(f"{k}={v}" for k, v in sorted(params.items()) if k != "api_key")
+        return f"{path}?{query}"
+
+    def get_or_fetch(self, path, params, fetch):
+        """
+        Return the cached JSON for (path, params), calling fetch() to
+        fill it on a miss. Errors raised by fetch are not cached.
+        Every caller gets its own decoded copy.
+        """
+        key, ttl = self.make_key(path, params), self.ttl_for(path)
+        value = self.backend.get(key) if ttl > 0 else None
+        metrics.incr("tmdb.cache.hits" if value is not None else "tmdb.cache.misses")
+        if value is None:
+            value = self.coalescer.do(key, lambda: self._fill(key, ttl, fetch))
+        return json.loads(value)
+
+    def refresh(self, path, params, fetch):
+        """
+        Call fetch() whatever is cached for (path, params) and store the
+        result, so later readers get it too.
+        """
+        key, ttl = self.make_key(path, params), self.ttl_for(path)
+        metrics.incr("tmdb.cache.refreshes")
+        value = json.dumps(fetch()).encode()
+        if ttl > 0:
+            self.backend.set(key, value, ttl)
+        return json.loads(value)
+
+    def _fill(self, key, ttl, fetch):
+        if ttl > 0:
+            # A call for this key may have finished since our lookup.
+            value = self.backend.get(key)
+            if value is not None:
+                return value
+        value = json.dumps(fetch()).encode()
+        if ttl > 0:
+            self.backend.set(key, value, ttl)
+        return value
+
+    async def aget_or_fetch(self, path, params, fetch):
+        """
+        Async get_or_fetch: fetch is a coroutine function. Calls to a
+        blocking backend run in a worker thread.
+        """
+        key, ttl = self.make_key(path, params), self.ttl_for(path)
+        value = await self._backend_call(self.backend.get, key) if ttl > 0 else None
+        metrics.incr("tmdb.cache.hits" if value is not None else "tmdb.cache.misses")
+        if value is None:
+            value = await self.coalescer.ado(key, lambda: self._afill(key, ttl, fetch))
+        return json.loads(value)
+
+    async def _afill(self, key, ttl, fetch):
+        if ttl > 0:
+            value = await self._backend_call(self.backend.get, key)
+            if value is not None:
+                return value
+        value = json.dumps(await fetch()).encode()
+        if ttl > 0:
+            await self._backend_call(self.backend.set, key, value, ttl)
+        return value
+
+    async def _backend_call(self, func, *args):
+        if getattr(self.backend, "blocking", True):
+            return await asyncio.to_thread(func, *args)
+        return func(*args)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+BACKENDS = ("locmem", "redis")
+
+
+def build_cache(config):
+    backend_name = config.get("BACKEND", "locmem")
+    if backend_name not in BACKENDS:
+        raise ImproperlyConfigured(f"Unknown TMDB_CACHE_BACKEND {backend_name!r}, expected one of {BACKENDS}.")
+    if backend_name == "redis":
+        backend = RedisBackend.from_url(config["REDIS_URL"])
+    else:
+        backend = LocMemBackend(max_bytes=config.get("MAX_BYTES", 64 * 1024 * 1024))
+    return TMDbCache(backend, config.get("TTLS", {}))
+
+
+def get_tmdb_cache():
+    """
+    Return the process-wide TMDb cache configured by settings.TMDB_CACHE.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = build_cache(settings.TMDB_CACHE)
+    return _cache
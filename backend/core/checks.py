@@ -0,0 +1,56 @@
+"""
+System checks for settings the core app depends on.
+"""
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.checks import Error, Tags, Warning, register
+
+# Cache backends whose entries are only visible to the process that wrote them
+PROCESS_LOCAL_CACHES = frozenset((
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+))
+
+
+def cache_is_shared():
+    """
+    True if CACHES['default'] is shared by all worker processes.
+
+    Per-user library caches, the read-your-writes window and recent
+    token revocations are invalidated through this cache; with a
+    process-local backend a write on one worker would not reach the
+    others, so those features bypass the cache instead.
+    """
+    return settings.CACHES["default"]["BACKEND"] not in PROCESS_LOCAL_CACHES
+
+
+@register(Tags.caches)
+def check_cache_is_shared(app_configs, **kwargs):
+    if cache_is_shared():
+        return []
+    return [
+        Warning(
+            "CACHES['default'] is process-local.",
+            hint=(
+                "Per-user library caching, sticky primary reads and cached token "
+                "revocations are disabled. Set CACHE_BACKEND to a shared backend "
+                "such as Redis or Memcached."
+            ),
+            id="core.W001",
+        )
+    ]
+
+
+@register(Tags.caches)
+def check_tmdb_cache_backend(app_configs, **kwargs):
+    """
+    Report a TMDb response cache that could not be built, at startup
+    rather than on the first TMDb call.
+    """
+    from .cache import build_cache
+
+    try:
+        build_cache(settings.TMDB_CACHE)  # does not connect to Redis
+    except ImproperlyConfigured as e:
+        return [Error(str(e), id="core.E001")]
+    return []
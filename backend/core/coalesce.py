@@ -0,0 +1,96 @@
+"""
+In-flight request coalescing.
+
+A Coalescer runs at most one call per key at a time: callers that ask
+for a key while a call for it is in flight wait for that call and get
+its result (or its exception) instead of starting their own. It works
+for threads (do) and for coroutines (ado); coroutines are coalesced per
+event loop. Leaders (callers that ran the call) and followers (callers
+that shared one) are counted in core.metrics.
+"""
+import asyncio
+import threading
+import weakref
+
+from . import metrics
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Coalescer:
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}  # key -> _Call
+        self._tasks = weakref.WeakKeyDictionary()  # event loop -> {key: Task}
+        self._lock = threading.Lock()
+        metrics.register(f"coalesce.{name}", self.stats)
+
+    def do(self, key, func):
+        """
+        Return func(), shared with the threads asking for key meanwhile.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        self._count(leader)
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    async def ado(self, key, func):
+        """
+        Return await func(), shared with the coroutines of this event
+        loop asking for key meanwhile. The call runs as its own task, so
+        a cancelled caller does not cancel it for the others.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            tasks = self._tasks.setdefault(loop, {})
+        task = tasks.get(key)
+        leader = task is None
+        if leader:
+            task = tasks[key] = loop.create_task(func())
+            task.add_done_callback(lambda _: tasks.pop(key, None))
+        self._count(leader)
+        return await asyncio.shield(task)
+
+    def _count(self, leader):
+        metrics.incr(f"coalesce.{self.name}.{'leaders' if leader else 'followers'}")
+
+    def stats(self):
+        counters = metrics.counters(f"coalesce.{self.name}.")
+        leaders, followers = counters.get("leaders", 0), counters.get("followers", 0)
+        with self._lock:
+            # Snapshot: loops can be collected, and their entries dropped,
+            # while we count.
+            loop_tasks = list(self._tasks.values())
+            in_flight = len(self._calls)
+        in_flight += sum(len(tasks) for tasks in loop_tasks)
+        return {
+            "leaders": leaders,
+            "followers": followers,
+            "hit_ratio": metrics.ratio(followers, leaders + followers),
+            "in_flight": in_flight,
+        }
@@ -0,0 +1,35 @@
+"""
+Database connection statistics, published in core.metrics under "db".
+"""
+from django.db import connections
+
+from . import metrics
+
+
+def connection_stats():
+    """
+    Per database alias: the psycopg pool statistics and saturation
+    (connections in use / max_size) when DB_POOL is on, otherwise the
+    persistent connection settings.
+    """
+    stats = {}
+    for alias in connections:
+        settings_dict = connections.settings[alias]
+        if not settings_dict.get("OPTIONS", {}).get("pool"):
+            stats[alias] = {
+                "pool": None,
+                "conn_max_age": settings_dict.get("CONN_MAX_AGE"),
+                "conn_health_checks": settings_dict.get("CONN_HEALTH_CHECKS"),
+            }
+            continue
+        pool = connections[alias].pool.get_stats()
+        in_use = pool.get("pool_size", 0) - pool.get("pool_available", 0)
+        stats[alias] = {
+            "pool": pool,
+            "in_use": in_use,
+            "saturation": metrics.ratio(in_use, pool.get("pool_max", 0)),
+        }
+    return stats
+
+
+metrics.register("db", connection_stats)
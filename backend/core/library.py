@@ -0,0 +1,426 @@
+"""
+Shared helpers for the per-user library endpoints
+(watchlist, favorites, watched history and preferences).
+"""
+import base64
+import hashlib
+import time as clock
+from datetime import datetime, time
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from .checks import cache_is_shared
+from .metadata import fetch_movies, get_movies, movie_summary
+from .models import Watchlist, Favorite, WatchedHistory, UserPreference, InteractionEvent
+from .routers import replica_reads, stick_to_primary
+from .serializers import values_serializer
+
+
+# Bits of the per-movie state returned by library_state()
+STATE_WATCHLIST = 1
+STATE_FAVORITE = 2
+STATE_WATCHED = 4
+STATE_LIKED = 8
+STATE_DISLIKED = 16
+STATE_FLAGS = {
+    "watchlist": STATE_WATCHLIST,
+    "favorite": STATE_FAVORITE,
+    "watched": STATE_WATCHED,
+    "liked": STATE_LIKED,
+    "disliked": STATE_DISLIKED,
+}
+
+
+def _version_key(user_id):
+    return f"library:version:{user_id}"
+
+
+def library_version(user_id):
+    """
+    Current version of the user's library. Cached library payloads are
+    keyed by it, so bumping it invalidates all of them at once.
+    """
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock so a version lost to eviction is never reused.
+        cache.add(key, clock.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_library_version(user_id):
+    """
+    Invalidate the user's cached library payloads. Call after every write.
+    """
+    if not cache_is_shared():
+        return  # nothing is cached (see cache_is_shared())
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        cache.set(_version_key(user_id), clock.time_ns(), timeout=None)
+
+
+def library_changed(model, user_id, movie_ids):
+    """
+    Hook for every library write. Must run inside the write's transaction:
+    it appends InteractionEvent rows for the recommendation worker and
+    invalidates the user's cached payloads once the transaction commits,
+    keeping the user's reads on the primary for a while (core.routers).
+    """
+    source = model._meta.model_name
+    InteractionEvent.objects.bulk_create(
+        [InteractionEvent(user_id=user_id, movie_id=movie_id, source=source) for movie_id in movie_ids]
+    )
+
+    def committed():
+        stick_to_primary(user_id)
+        bump_library_version(user_id)
+
+    transaction.on_commit(committed)
+
+
+def upsert_library_row(model, user_id, movie_id, **fields):
+    """
+    Insert or update the (user, movie_id) row of a library model in one
+    INSERT ... ON CONFLICT statement, relying on its unique constraint,
+    and return the stored row.
+    """
+    with transaction.atomic():
+        model.objects.bulk_create(
+            [model(user_id=user_id, movie_id=movie_id, **fields)],
+            update_conflicts=True,
+            unique_fields=["user", "movie_id"],
+            update_fields=[*fields, "updated_at"],
+        )
+        library_changed(model, user_id, [movie_id])
+    return model.objects.get(user=user_id, movie_id=movie_id)
+
+
+def remove_library_row(model, user_id, movie_id):
+    """
+    Delete the (user, movie_id) row of a library model.
+    Returns False if there was no such row.
+    """
+    with transaction.atomic():
+        deleted, _ = model.objects.filter(user=user_id, movie_id=movie_id).delete()
+        if deleted:
+            library_changed(model, user_id, [movie_id])
+    return bool(deleted)
+
+
+def wants_movie_expansion(request):
+    return request.query_params.get("expand") == "movie"
+
+
+def expand_movies(rows):
+    """
+    Embed a "movie" summary in each serialized row.
+    Stored metadata is read in one query; missing movies are fetched
+    from TMDb in one concurrent, cached batch. Rows whose movie cannot
+    be resolved get "movie": null.
+    """
+    movie_ids = {str(row["movie_id"]) for row in rows}
+    movies = get_movies(movie_ids)
+    missing = [movie_id for movie_id in movie_ids if movie_id not in movies]
+    if missing:
+        try:
+            movies.update(fetch_movies(missing))
+        except requests.exceptions.RequestException:
+            pass  # serve what we have, the next request retries
+    for row in rows:
+        movie = movies.get(str(row["movie_id"]))
+        row["movie"] = movie_summary(movie) if movie else None
+    return rows
+
+
+def encode_cursor(row):
+    value = f"{row['created_at'].isoformat()}|{row['id']}"
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        created_at = parse_datetime(created_at)
+        if created_at is None:
+            raise ValueError
+        return created_at, int(pk)
+    except ValueError:
+        raise ValidationError({"cursor": "Invalid cursor."})
+
+
+def get_page_size(request):
+    try:
+        page_size = int(request.query_params.get("page_size", settings.LIBRARY_PAGE_SIZE))
+    except ValueError:
+        raise ValidationError({"page_size": "Must be an integer."})
+    if not 1 <= page_size <= settings.LIBRARY_MAX_PAGE_SIZE:
+        raise ValidationError({"page_size": f"Must be between 1 and {settings.LIBRARY_MAX_PAGE_SIZE}."})
+    return page_size
+
+
+def paginate_by_cursor(request, queryset):
+    """
+    Keyset pagination on (created_at, id), newest first, of a .values()
+    queryset that includes both columns.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    The cost of a page does not depend on how many rows come before it.
+    """
+    page_size = get_page_size(request)
+    cursor = request.query_params.get("cursor")
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+    rows = list(queryset.order_by("-created_at", "-id")[:page_size + 1])
+    next_cursor = encode_cursor(rows[page_size - 1]) if len(rows) > page_size else None
+    return rows[:page_size], next_cursor
+
+
+def parse_datetime_param(request, name, end_of_day=False):
+    """
+    Read an ISO date or datetime query parameter as an aware datetime.
+    A bare date means the start (or end) of that day.
+    """
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        # Dates first: parse_datetime() also accepts a bare date, as midnight.
+        day = parse_date(value)
+        if day is not None:
+            parsed = datetime.combine(day, time.max if end_of_day else time.min)
+        else:
+            parsed = parse_datetime(value)
+            if parsed is None:
+                raise ValueError
+    except ValueError:  # malformed, or well formed but out of range
+        raise ValidationError({name: "Must be an ISO 8601 date or datetime."})
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def library_list_response(request, queryset, serializer_class):
+    """
+    Serialize one cursor page of a library queryset:
+    {"results": [...], "next": "<cursor>" | null}.
+
+    Pages are cached per user, library version and query string, and
+    carry an ETag derived from the same values, so a client revalidating
+    an unchanged library gets a 304 before any query runs. Writes go
+    through library_changed(), which bumps the version. Without a shared
+    cache every request reads the database and no ETag is sent.
+
+    Movie summaries (?expand=movie) are not cached: they change when the
+    metadata is refreshed, not when the library does. They are embedded
+    into the cached page on every request and hashed into the ETag.
+    """
+    user_id = request.user.id
+    expand = wants_movie_expansion(request)
+    if not cache_is_shared():
+        payload = _list_payload(request, queryset, serializer_class)
+        if expand:
+            payload["results"] = expand_movies(payload["results"])
+        response = Response(payload)
+        response["Cache-Control"] = "private, no-cache"
+        return response
+
+    query = sorted((name, sorted(values)) for name, values in request.query_params.lists() if name != "expand")
+    digest = hashlib.sha1(repr((queryset.model._meta.model_name, query)).encode()).hexdigest()
+    key = f"library:list:{user_id}:{library_version(user_id)}:{digest}"
+    etag = f'"{hashlib.sha1(key.encode()).hexdigest()}"'
+
+    response = None if expand else get_conditional_response(request, etag=etag)
+    if response is None:
+        payload = cache.get(key)
+        if payload is None:
+            payload = _list_payload(request, queryset, serializer_class)
+            cache.set(key, payload, settings.LIBRARY_CACHE_TIMEOUT)
+        if expand:
+            payload["results"] = expand_movies(payload["results"])
+            movies = repr([row["movie"] for row in payload["results"]])
+            etag = f'"{hashlib.sha1((key + movies).encode()).hexdigest()}"'
+            response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = Response(payload)
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def _list_payload(request, queryset, serializer_class):
+    serializer = values_serializer(serializer_class)
+    with replica_reads(request.user.id):
+        rows, next_cursor = paginate_by_cursor(request, serializer.rows(queryset))
+    return {"results": serializer.data(rows), "next": next_cursor}
+
+
+def no_fields(item):
+    return {}
+
+
+def watchlist_fields(item):
+    status = item.get("status", "to_watch")
+    if status not in dict(Watchlist.STATUS_CHOICES):
+        raise ValueError("Invalid status")
+    return {"status": status}
+
+
+def preference_fields(item):
+    """
+    liked and disliked are mutually exclusive; liked wins.
+    """
+    liked = bool(item.get("liked", False))
+    disliked = bool(item.get("disliked", False)) and not liked
+    return {"liked": liked, "disliked": disliked}
+
+
+def apply_bulk(model, user_id, items, clean_fields=no_fields):
+    """
+    Apply a batch of {"movie_id": ..., "op": "add" | "remove", ...}
+    items to a library model in one transaction.
+    Adds are a single INSERT ... ON CONFLICT DO UPDATE, removes a single
+    DELETE, plus one SELECT to report what existed before, so the number
+    of queries does not depend on the batch size.
+    Returns one result per item, in order: "created", "updated",
+    "removed", "not_found" or "error" (with an "error" message).
+    """
+    results = []
+    adds = {}
+    removes = set()
+    for item in items:
+        movie_id = str(item.get("movie_id") or "") if isinstance(item, dict) else ""
+        result = {"movie_id": movie_id or None}
+        results.append(result)
+        try:
+            if not movie_id:
+                raise ValueError("movie_id is required")
+            if movie_id in adds or movie_id in removes:
+                raise ValueError("Duplicate movie_id in batch")
+            op = item.get("op", "add")
+            if op == "add":
+                adds[movie_id] = clean_fields(item)
+            elif op == "remove":
+                removes.add(movie_id)
+            else:
+                raise ValueError("op must be 'add' or 'remove'")
+        except ValueError as e:
+            result.update(result="error", error=str(e))
+
+    with transaction.atomic():
+        existing = set(
+            model.objects.filter(user=user_id, movie_id__in=[*adds, *removes])
+            .values_list("movie_id", flat=True)
+        ) if adds or removes else set()
+        if adds:
+            update_fields = [*next(iter(adds.values())), "updated_at"]
+            model.objects.bulk_create(
+                [model(user_id=user_id, movie_id=movie_id, **fields) for movie_id, fields in adds.items()],
+                update_conflicts=True,
+                unique_fields=["user", "movie_id"],
+                update_fields=update_fields,
+            )
+        if removes:
+            model.objects.filter(user=user_id, movie_id__in=removes).delete()
+        if adds or removes:
+            library_changed(model, user_id, [*adds, *(removes & existing)])
+
+    for result in results:
+        movie_id = result["movie_id"]
+        if "result" in result:
+            continue
+        if movie_id in adds:
+            result["result"] = "updated" if movie_id in existing else "created"
+        else:
+            result["result"] = "removed" if movie_id in existing else "not_found"
+    return results
+
+
+def bulk_response(request, model, clean_fields=no_fields):
+    """
+    Validate a bulk request body ({"items": [...]}) and apply it.
+    """
+    if not isinstance(request.data, dict):
+        raise ValidationError({"items": "Expected an object with an items list."})
+    items = request.data.get("items")
+    if not isinstance(items, list) or not items:
+        raise ValidationError({"items": "Must be a non-empty list."})
+    if len(items) > settings.LIBRARY_MAX_BULK_ITEMS:
+        raise ValidationError({"items": f"At most {settings.LIBRARY_MAX_BULK_ITEMS} items per request."})
+    return Response({"results": apply_bulk(model, request.user.id, items, clean_fields)})
+
+
+def _flagged(model, user_id, movie_ids, flag):
+    return (
+        model.objects.filter(user=user_id, movie_id__in=movie_ids)
+        .annotate(flag=flag)
+        .values_list("movie_id", "flag")
+    )
+
+
+def library_state(user_id, movie_ids):
+    """
+    Return {movie_id: bitmask of STATE_FLAGS} for movie_ids, read with
+    a single UNION ALL query over the four library tables and cached
+    per user until the next library write.
+    """
+    movie_ids = sorted(set(movie_ids))
+    shared = cache_is_shared()
+    if shared:
+        digest = hashlib.sha1(",".join(movie_ids).encode()).hexdigest()
+        key = f"library:state:{user_id}:{library_version(user_id)}:{digest}"
+        states = cache.get(key)
+        if states is not None:
+            return states
+
+    preference_flag = Case(
+        When(liked=True, then=Value(STATE_LIKED)),
+        default=Value(STATE_DISLIKED),
+        output_field=IntegerField(),
+    )
+    rows = _flagged(Watchlist, user_id, movie_ids, Value(STATE_WATCHLIST)).union(
+        _flagged(Favorite, user_id, movie_ids, Value(STATE_FAVORITE)),
+        _flagged(WatchedHistory, user_id, movie_ids, Value(STATE_WATCHED)),
+        _flagged(UserPreference, user_id, movie_ids, preference_flag).filter(Q(liked=True) | Q(disliked=True)),
+        all=True,
+    )
+    states = dict.fromkeys(movie_ids, 0)
+    with replica_reads(user_id):
+        for movie_id, flag in rows:
+            states[movie_id] |= flag
+    if shared:
+        cache.set(key, states, settings.LIBRARY_CACHE_TIMEOUT)
+    return states
+
+
+def preference_ids(user_id):
+    """
+    Return {"liked": [...], "disliked": [...]} movie ids of the user,
+    read in one query and cached until the next library write.
+    """
+    shared = cache_is_shared()
+    key = f"library:preferences:{user_id}:{library_version(user_id)}" if shared else None
+    ids = cache.get(key) if shared else None
+    if ids is None:
+        ids = {"liked": [], "disliked": []}
+        rows = (
+            UserPreference.objects.filter(Q(liked=True) | Q(disliked=True), user=user_id)
+            .order_by("-created_at", "-id")
+            .values_list("movie_id", "liked")
+        )
+        with replica_reads(user_id):
+            for movie_id, liked in rows:
+                ids["liked" if liked else "disliked"].append(movie_id)
+        if shared:
+            cache.set(key, ids, settings.LIBRARY_CACHE_TIMEOUT)
+    return ids
@@ -0,0 +1,100 @@
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.test.utils import setup_databases, teardown_databases
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.models import Watchlist
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure requests/sec of a library list endpoint with a new database connection per "
+        "request, then with the configured connection reuse (persistent connections or pool). "
+        "Runs against a throwaway test database created from the configured one, so the real "
+        "database is never written to (the database user needs permission to create it)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=1000, help="Requests per mode.")
+        parser.add_argument("--threads", type=int, default=8, help="Concurrent clients.")
+        parser.add_argument("--path", default="/api/watchlist/all/", help="Endpoint to call.")
+        parser.add_argument("--database", default="default", help="Database alias to tune.")
+
+    def handle(self, *args, **options):
+        alias = options["database"]
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={alias, *settings.DATABASE_REPLICAS})
+        try:
+            self.bench(options, alias)
+        finally:
+            connections.close_all()
+            teardown_databases(old_config, verbosity=0)
+
+    def bench(self, options, alias):
+        settings_dict = connections.settings[alias]
+        user = User.objects.create_user(username="bench-db")
+        Watchlist.objects.bulk_create([Watchlist(user=user, movie_id=str(i)) for i in range(50)])
+        token = str(AccessToken.for_user(user))
+        baseline = {
+            "CONN_MAX_AGE": 0,
+            "OPTIONS": {k: v for k, v in settings_dict.get("OPTIONS", {}).items() if k != "pool"},
+        }
+        for label, overrides in (("new connection per request", baseline), ("configured", {})):
+            saved = {key: settings_dict.get(key) for key in overrides}
+            settings_dict.update(overrides)
+            connections.close_all()
+            try:
+                rate, opened = self.run(options, token)
+            finally:
+                settings_dict.update(saved)
+                connections.close_all()
+            self.stdout.write(f"{label:<28} {rate:8.1f} requests/s, {opened} connections opened")
+
+    def run(self, options, token):
+        per_thread = max(1, options["requests"] // options["threads"])
+        opened = 0
+        opened_lock = threading.Lock()
+        errors = []
+
+        def on_connect(sender, connection, **kwargs):
+            nonlocal opened
+            with opened_lock:
+                opened += 1
+
+        def worker():
+            client = Client(HTTP_AUTHORIZATION=f"Bearer {token}")
+            try:
+                for i in range(per_thread):
+                    # Vary the query string so the library cache is not hit.
+                    response = client.get(options["path"], {"page_size": 20, "bench": i})
+                    # The test client skips the request_finished handler that
+                    # applies CONN_MAX_AGE / returns pooled connections.
+                    close_old_connections()
+                    if response.status_code != 200:
+                        errors.append(response.status_code)
+                        return
+            finally:
+                connections.close_all()
+
+        connection_created.connect(on_connect)
+        try:
+            threads = [threading.Thread(target=worker) for _ in range(options["threads"])]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+        finally:
+            connection_created.disconnect(on_connect)
+        if errors:
+            self.stderr.write(f"{len(errors)} clients stopped on HTTP {errors[0]}")
+        return per_thread * options["threads"] / elapsed, opened
@@ -0,0 +1,59 @@
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import get_hasher
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from core.serializers import LoginSerializer
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Count password hashes and queries per login through LoginSerializer for username, "
+        "email and failed logins. The test user is created in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=3, help="Logins per case; the mean time is reported.")
+
+    def handle(self, *args, **options):
+        repeat = options["repeat"]
+        hasher = get_hasher()
+        hashes = 0
+        encode = type(hasher).encode
+
+        def counting_encode(self, *args, **kwargs):
+            nonlocal hashes
+            hashes += 1
+            return encode(self, *args, **kwargs)
+
+        with transaction.atomic():
+            name = f"bench-login-{time.time_ns()}"
+            User.objects.create_user(username=name, email=f"{name}@example.com", password="bench-password")
+            cases = [
+                ("username", name, "bench-password"),
+                ("email", f"{name}@example.com", "bench-password"),
+                ("email, other case", f"{name.upper()}@EXAMPLE.COM", "bench-password"),
+                ("wrong password", name, "wrong-password"),
+                ("unknown user", f"nobody-{name}", "bench-password"),
+            ]
+            self.stdout.write(f"Hasher: {hasher.algorithm}")
+            with mock.patch.object(type(hasher), "encode", counting_encode):
+                for label, username, password in cases:
+                    hashes = 0
+                    started = time.perf_counter()
+                    with CaptureQueriesContext(connection) as queries:
+                        for _ in range(repeat):
+                            valid = LoginSerializer(data={"username": username, "password": password}).is_valid()
+                    elapsed = (time.perf_counter() - started) / repeat
+                    self.stdout.write(
+                        f"{label:<18} {'ok' if valid else 'rejected':<8} "
+                        f"{hashes / repeat:.1f} hashes/login, {len(queries) / repeat:.1f} queries/login, "
+                        f"{elapsed * 1000:.0f} ms/login"
+                    )
+            transaction.set_rollback(True)
@@ -0,0 +1,67 @@
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from core.models import Favorite, Recommendation, UserPreference, WatchedHistory, Watchlist
+from core.renderers import ORJSONRenderer
+from core.serializers import (
+    FavoriteSerializer, RecommendationSerializer, UserPreferenceSerializer, WatchedHistorySerializer,
+    WatchlistSerializer, values_serializer,
+)
+
+BENCHMARKS = (
+    (Watchlist, WatchlistSerializer),
+    (Favorite, FavoriteSerializer),
+    (WatchedHistory, WatchedHistorySerializer),
+    (UserPreference, UserPreferenceSerializer),
+    (Recommendation, RecommendationSerializer),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare ModelSerializer + JSONRenderer with the .values() fast path + ORJSONRenderer "
+        "on large lists. Rows are created in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10000, help="Rows per list.")
+        parser.add_argument("--repeat", type=int, default=5, help="Runs per path; the best one is reported.")
+
+    def handle(self, *args, **options):
+        rows, repeat = options["rows"], options["repeat"]
+        with transaction.atomic():
+            user = User.objects.create_user(username=f"bench-serializers-{time.time_ns()}")
+            for model, serializer_class in BENCHMARKS:
+                model.objects.bulk_create(
+                    [model(user=user, movie_id=str(i)) for i in range(rows)], batch_size=1000
+                )
+                queryset = model.objects.filter(user=user).order_by("-id")
+                fast = values_serializer(serializer_class)
+
+                def drf():
+                    return JSONRenderer().render(serializer_class(list(queryset), many=True).data)
+
+                def values():
+                    return ORJSONRenderer().render(fast.data(list(fast.rows(queryset))))
+
+                if json.loads(drf()) != json.loads(values()):
+                    raise CommandError(f"{model.__name__}: the fast path output differs")
+                drf_time = min(self.timed(drf) for _ in range(repeat))
+                values_time = min(self.timed(values) for _ in range(repeat))
+                self.stdout.write(
+                    f"{model.__name__:<15} {rows} rows: "
+                    f"serializer {drf_time / rows * 1e6:6.2f} us/row, "
+                    f"values {values_time / rows * 1e6:6.2f} us/row "
+                    f"({drf_time / values_time:.1f}x)"
+                )
+            transaction.set_rollback(True)
+
+    def timed(self, func):
+        started = time.perf_counter()
+        func()
+        return time.perf_counter() - started
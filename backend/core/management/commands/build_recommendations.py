@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.recommender import build_recommendations
+
+
+class Command(BaseCommand):
+    help = "Recompute the top-N recommendations of every user from library activity."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=None, help="Recommendations per user (default: RECOMMENDATIONS_TOP_N).")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Users scored per batch.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        users = build_recommendations(n=options["top"], batch_size=options["batch_size"])
+        self.stdout.write(f"Built recommendations for {users} users in {time.monotonic() - started:.2f}s")
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.similarity import build_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the content-based similar movies index from the local Movie table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--neighbours",
+            type=int,
+            default=None,
+            help="Neighbours stored per movie (default: SIMILARITY_NEIGHBOURS).",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        movies = build_index(k=options["neighbours"])
+        self.stdout.write(f"Indexed {movies} movies in {time.monotonic() - started:.2f}s")
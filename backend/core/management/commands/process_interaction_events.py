@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.recommender import process_events
+
+
+class Command(BaseCommand):
+    help = "Apply pending library changes to the recommender and refresh the affected users."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Events consumed per batch.")
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Keep running and poll for events every INTERVAL seconds (default: drain once).",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            processed = process_events(batch_size=options["batch_size"])
+            while processed:
+                self.stdout.write(f"Processed {processed} events")
+                processed = process_events(batch_size=options["batch_size"])
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired refresh tokens from the outstanding token list, together with their "
+        "blacklist entries, in batches so the tables stay bounded without long locks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000, help="Tokens deleted per statement.")
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Keep running and prune every INTERVAL seconds (default: prune once).",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = self.prune(options["batch_size"])
+            self.stdout.write(
+                f"Pruned {deleted} expired tokens; {OutstandingToken.objects.count()} outstanding, "
+                f"{BlacklistedToken.objects.count()} blacklisted"
+            )
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
+
+    def prune(self, batch_size):
+        now = timezone.now()
+        deleted = 0
+        while True:
+            ids = list(
+                OutstandingToken.objects.filter(expires_at__lte=now)
+                .order_by("expires_at")
+                .values_list("id", flat=True)[:batch_size]
+            )
+            if not ids:
+                return deleted
+            BlacklistedToken.objects.filter(token_id__in=ids).delete()
+            OutstandingToken.objects.filter(id__in=ids).delete()
+            deleted += len(ids)
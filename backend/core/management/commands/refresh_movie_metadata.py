@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.metadata import fetch_movies
+from core.models import Movie
+
+
+class Command(BaseCommand):
+    help = "Re-fetch stale Movie metadata rows from TMDb."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Refresh every row, not only stale ones.")
+        parser.add_argument("--batch-size", type=int, default=100)
+
+    def handle(self, *args, **options):
+        movies = Movie.objects.order_by("fetched_at")
+        if not options["all"]:
+            cutoff = timezone.now() - timedelta(seconds=settings.MOVIE_METADATA_TTL)
+            movies = movies.filter(fetched_at__lt=cutoff)
+        movie_ids = list(movies.values_list("movie_id", flat=True))
+
+        batch_size = options["batch_size"]
+        refreshed = 0
+        for i in range(0, len(movie_ids), batch_size):
+            refreshed += len(fetch_movies(movie_ids[i:i + batch_size], refresh=True))
+        self.stdout.write(f"Refreshed {refreshed} of {len(movie_ids)} movies")
@@ -0,0 +1,33 @@
+import time
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from core.snapshot import refresh_popular_snapshot
+
+
+class Command(BaseCommand):
+    help = "Rebuild the detailed popular movies snapshot served by /api/movies/popular/."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=0,
+            help="Keep running and rebuild every INTERVAL seconds (default: run once).",
+        )
+
+    def handle(self, *args, **options):
+        interval = options["interval"]
+        while True:
+            try:
+                snapshot = refresh_popular_snapshot()
+                self.stdout.write(f"Built popular snapshot {snapshot.etag} at {snapshot.built_at}")
+            except requests.exceptions.RequestException as e:
+                if not interval:
+                    raise CommandError(f"Popular snapshot refresh failed: {e}")
+                # Keep serving the last good snapshot and retry on the next tick.
+                self.stderr.write(f"Popular snapshot refresh failed: {e}")
+            if not interval:
+                return
+            time.sleep(interval)
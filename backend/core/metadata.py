@@ -0,0 +1,153 @@
+"""
+Local movie metadata store.
+
+Movie rows are written through from the movie payloads we already
+build from TMDb (see core.tmdb.format_movie). Rows older than
+MOVIE_METADATA_TTL are stale: they are still served, and refreshed
+from TMDb in the background.
+"""
+import threading
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Movie
+from .tmdb import fan_out, fetch_movie_details
+
+MOVIE_FIELDS = ["title", "poster", "genres", "runtime", "rating", "release_date", "fetched_at"]
+
+_refreshing = set()  # movie ids with a background refresh in progress
+_refreshing_lock = threading.Lock()
+
+
+def movie_from_payload(payload, fetched_at=None):
+    """
+    Build an unsaved Movie from a format_movie payload.
+    """
+    return Movie(
+        movie_id=str(payload["id"]),
+        title=payload["title"],
+        poster=payload.get("poster"),
+        genres=payload.get("genres", []),
+        cast=[c["id"] for c in payload.get("cast", [])],
+        runtime=payload.get("runtime"),
+        rating=payload.get("rating"),
+        release_date=parse_date(payload.get("releaseDate") or ""),
+        fetched_at=fetched_at or timezone.now(),
+    )
+
+
+def movie_summary(movie):
+    """
+    Compact movie payload embedded in library lists.
+    """
+    return {
+        "id": int(movie.movie_id),
+        "title": movie.title,
+        "releaseDate": movie.release_date.isoformat() if movie.release_date else None,
+        "rating": movie.rating,
+        "runtime": movie.runtime,
+        "genres": movie.genres,
+        "poster": movie.poster,
+    }
+
+
+def store_movies(payloads):
+    """
+    Insert or update Movie rows from format_movie payloads in one query.
+    """
+    now = timezone.now()
+    movies = {str(p["id"]): movie_from_payload(p, now) for p in payloads}
+    # Payloads built without credits must not wipe the stored cast.
+    with_cast = [movie for movie in movies.values() if movie.cast]
+    without_cast = [movie for movie in movies.values() if not movie.cast]
+    for batch, update_fields in ((with_cast, [*MOVIE_FIELDS, "cast"]), (without_cast, MOVIE_FIELDS)):
+        if batch:
+            Movie.objects.bulk_create(
+                batch,
+                update_conflicts=True,
+                unique_fields=["movie_id"],
+                update_fields=update_fields,
+            )
+    return movies
+
+
+def remember_movies(payloads):
+    """
+    Write-through hook for movie payloads built while serving a request.
+    Only movies that are missing or stale locally are written, so hot
+    read paths cost one SELECT and no writes.
+    """
+    if not payloads:
+        return {}
+    cutoff = timezone.now() - timedelta(seconds=settings.MOVIE_METADATA_TTL)
+    fresh = set(
+        Movie.objects.filter(movie_id__in=[str(p["id"]) for p in payloads], fetched_at__gte=cutoff)
+        .values_list("movie_id", flat=True)
+    )
+    return store_movies([p for p in payloads if str(p["id"]) not in fresh])
+
+
+def is_stale(movie):
+    return movie.fetched_at < timezone.now() - timedelta(seconds=settings.MOVIE_METADATA_TTL)
+
+
+def _fetch_or_none(movie_id, refresh=False):
+    try:
+        return fetch_movie_details(movie_id, refresh)
+    except requests.exceptions.HTTPError as e:
+        if e.response is not None and e.response.status_code == 404:
+            return None
+        raise
+
+
+def fetch_movies(movie_ids, refresh=False):
+    """
+    Fetch movies from TMDb concurrently and store them.
+    Returns {movie_id: Movie}; ids unknown to TMDb are left out.
+    With refresh, TMDb is asked even if its response is still cached.
+    """
+    payloads = fan_out(lambda movie_id: _fetch_or_none(movie_id, refresh), movie_ids)
+    return store_movies([p for p in payloads if p is not None])
+
+
+def refresh_in_background(movie_ids):
+    """
+    Re-fetch stale movies in a daemon thread. Ids already being
+    refreshed are skipped.
+    """
+    with _refreshing_lock:
+        movie_ids = [m for m in movie_ids if m not in _refreshing]
+        _refreshing.update(movie_ids)
+    if not movie_ids:
+        return
+
+    def run():
+        try:
+            fetch_movies(movie_ids, refresh=True)
+        except requests.exceptions.RequestException:
+            pass  # keep serving the stale rows, the next read retries
+        finally:
+            with _refreshing_lock:
+                _refreshing.difference_update(movie_ids)
+            connection.close()
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def get_movies(movie_ids, refresh_stale=True):
+    """
+    Return {movie_id: Movie} for the stored movies among movie_ids in
+    one query, scheduling a background refresh of the stale ones unless
+    refresh_stale is False.
+    """
+    movies = Movie.objects.in_bulk([str(m) for m in movie_ids], field_name="movie_id")
+    if refresh_stale:
+        stale = [movie_id for movie_id, movie in movies.items() if is_stale(movie)]
+        if stale:
+            refresh_in_background(stale)
+    return movies
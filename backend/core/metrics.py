@@ -0,0 +1,70 @@
+"""
+In-process operational metrics, exposed by the metrics endpoint.
+
+Counters are plain named integers; timings keep the count, mean and
+maximum of observed durations. Components with richer state (hit
+ratios, pool statistics, ...) register a function returning a dict
+that is evaluated when metrics are read. Everything is per process:
+scrape each worker, or aggregate downstream.
+"""
+import threading
+from collections import Counter
+
+_counters = Counter()
+_timings = {}  # name -> [count, total, max]
+_sections = {}  # name -> function returning a dict
+_lock = threading.Lock()
+
+
+def incr(name, amount=1):
+    with _lock:
+        _counters[name] += amount
+
+
+def observe(name, seconds):
+    """
+    Record one duration under name.
+    """
+    with _lock:
+        timing = _timings.setdefault(name, [0, 0.0, 0.0])
+        timing[0] += 1
+        timing[1] += seconds
+        timing[2] = max(timing[2], seconds)
+
+
+def register(name, func):
+    """
+    Publish func() under name in snapshot(). Registering a name again
+    replaces the previous function.
+    """
+    with _lock:
+        _sections[name] = func
+
+
+def counters(prefix=""):
+    """
+    Return the counters whose name starts with prefix, without the prefix.
+    """
+    with _lock:
+        return {name[len(prefix):]: value for name, value in sorted(_counters.items()) if name.startswith(prefix)}
+
+
+def ratio(part, total):
+    return part / total if total else None
+
+
+def snapshot():
+    """
+    Return {"counters": {...}, "timings": {...}, <section>: {...}, ...}.
+    """
+    with _lock:
+        sections = dict(_sections)
+        timings = {
+            name: {"count": count, "mean_ms": total / count * 1000, "max_ms": longest * 1000}
+            for name, (count, total, longest) in sorted(_timings.items())
+        }
+    return {
+        "counters": counters(),
+        "timings": timings,
+        **{name: func() for name, func in sorted(sections.items())},
+    }
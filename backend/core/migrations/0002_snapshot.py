@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Snapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('payload', models.TextField()),
+                ('etag', models.CharField(max_length=64)),
+                ('built_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Movie',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('movie_id', models.CharField(max_length=50, unique=True)),
+                ('title', models.CharField(max_length=255)),
+                ('poster', models.URLField(blank=True, max_length=500, null=True)),
+                ('genres', models.JSONField(default=list)),
+                ('runtime', models.PositiveIntegerField(blank=True, null=True)),
+                ('rating', models.FloatField(blank=True, null=True)),
+                ('release_date', models.DateField(blank=True, null=True)),
+                ('fetched_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:52
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def remove_duplicates(apps, schema_editor):
+    """
+    Keep only the most recently updated row for each (user, movie_id)
+    so the unique constraints below can be created.
+    """
+    for model_name in ('Watchlist', 'Favorite', 'WatchedHistory', 'UserPreference'):
+        model = apps.get_model('core', model_name)
+        duplicates = (
+            model.objects.values('user', 'movie_id')
+            .annotate(rows=Count('id'))
+            .filter(rows__gt=1)
+        )
+        for duplicate in duplicates.iterator():
+            rows = model.objects.filter(user=duplicate['user'], movie_id=duplicate['movie_id'])
+            keep = rows.order_by('-updated_at', '-id').values_list('id', flat=True)[0]
+            rows.exclude(id=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_movie'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['user', '-created_at'], name='favorite_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userpreference',
+            index=models.Index(fields=['user', '-created_at'], name='preference_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='watchedhistory',
+            index=models.Index(fields=['user', '-created_at'], name='history_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='watchlist',
+            index=models.Index(fields=['user', '-created_at'], name='watchlist_user_created_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(fields=('user', 'movie_id'), name='unique_favorite_user_movie'),
+        ),
+        migrations.AddConstraint(
+            model_name='userpreference',
+            constraint=models.UniqueConstraint(fields=('user', 'movie_id'), name='unique_preference_user_movie'),
+        ),
+        migrations.AddConstraint(
+            model_name='watchedhistory',
+            constraint=models.UniqueConstraint(fields=('user', 'movie_id'), name='unique_history_user_movie'),
+        ),
+        migrations.AddConstraint(
+            model_name='watchlist',
+            constraint=models.UniqueConstraint(fields=('user', 'movie_id'), name='unique_watchlist_user_movie'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_library_constraints'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='favorite',
+            name='favorite_user_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='userpreference',
+            name='preference_user_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='watchedhistory',
+            name='history_user_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='watchlist',
+            name='watchlist_user_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='favorite_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userpreference',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='preference_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='watchedhistory',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='history_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='watchlist',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='watchlist_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='watchlist',
+            index=models.Index(fields=['user', 'status', '-created_at', '-id'], name='watchlist_user_status_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_interactionevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='cast',
+            field=models.JSONField(default=list),
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Case-insensitive index on auth_user.email for
+    core.backends.UsernameOrEmailBackend. auth.User is not ours to add
+    Meta indexes to, hence the raw SQL (valid on PostgreSQL and SQLite).
+    """
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0008_movie_cast'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS auth_user_email_lower_idx ON auth_user (LOWER(email));',
+            'DROP INDEX IF EXISTS auth_user_email_lower_idx;',
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Indexes on the simplejwt token_blacklist tables for the prune_tokens
+    command (expires_at) and the revocation set sync in core.tokens
+    (blacklisted_at). Those models are not ours to add Meta indexes to,
+    hence the raw SQL (valid on PostgreSQL and SQLite).
+    """
+
+    dependencies = [
+        ('token_blacklist', '0013_alter_blacklistedtoken_options_and_more'),
+        ('core', '0009_auth_user_email_lower_idx'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS outstandingtoken_expires_at_idx '
+            'ON token_blacklist_outstandingtoken (expires_at);',
+            'DROP INDEX IF EXISTS outstandingtoken_expires_at_idx;',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS blacklistedtoken_blacklisted_at_idx '
+            'ON token_blacklist_blacklistedtoken (blacklisted_at);',
+            'DROP INDEX IF EXISTS blacklistedtoken_blacklisted_at_idx;',
+        ),
+    ]
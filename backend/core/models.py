@@ -13,6 +13,15 @@ class Watchlist(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'movie_id'], name='unique_watchlist_user_movie'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='watchlist_user_created_idx'),
+            models.Index(fields=['user', 'status', '-created_at', '-id'], name='watchlist_user_status_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.movie_id} ({self.status})"
 
@@ -22,6 +31,14 @@ class Favorite(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'movie_id'], name='unique_favorite_user_movie'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='favorite_user_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.movie_id}"
 
@@ -31,6 +48,14 @@ class WatchedHistory(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'movie_id'], name='unique_history_user_movie'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='history_user_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} watched {self.movie_id}"
 
@@ -42,12 +67,72 @@ class UserPreference(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'movie_id'], name='unique_preference_user_movie'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='preference_user_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username}'s Preferences"
 
 class Recommendation(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     movie_id = models.CharField(max_length=50)
+    score = models.FloatField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-score'], name='recommendation_user_score_idx'),
+        ]
+
     def __str__(self):
         return f"Recommendation for {self.user.username}: {self.movie_id}"
+
+class InteractionEvent(models.Model):
+    """
+    Append-only outbox of library changes, written in the same
+    transaction as the change. The recommendation worker consumes it in
+    batches (see core.recommender.process_events).
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    movie_id = models.CharField(max_length=50)
+    source = models.CharField(max_length=20)  #! model name of the changed table
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.user_id} {self.source} {self.movie_id}"
+
+class Movie(models.Model):
+    """
+    Local copy of TMDb movie metadata, written through from TMDb
+    responses so lists can embed movie summaries without calling TMDb.
+    """
+    movie_id = models.CharField(max_length=50, unique=True)  #! TMDb id, same as the other tables
+    title = models.CharField(max_length=255)
+    poster = models.URLField(max_length=500, null=True, blank=True)
+    genres = models.JSONField(default=list)
+    cast = models.JSONField(default=list)  #! TMDb person ids of the top cast
+    runtime = models.PositiveIntegerField(null=True, blank=True)
+    rating = models.FloatField(null=True, blank=True)
+    release_date = models.DateField(null=True, blank=True)
+    fetched_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.title} ({self.movie_id})"
+
+class Snapshot(models.Model):
+    """
+    Pre-serialized JSON payload rebuilt in the background
+    (e.g. the detailed popular movies list).
+    """
+    name = models.CharField(max_length=50, unique=True)
+    payload = models.TextField()
+    etag = models.CharField(max_length=64)
+    built_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name} snapshot ({self.built_at})"
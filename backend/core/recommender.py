@@ -0,0 +1,298 @@
+"""
+Local item-item recommender.
+
+Library signals (favorites, likes, watched history, watchlist and
+dislikes) form a sparse user x movie interaction matrix X. Movie
+similarity is the cosine of the columns of X, computed from the
+co-occurrence matrix C = X^T X. A user's score for a movie is the sum
+of its similarities to the movies they interacted with, weighted by
+the strength of each interaction. Top-N lists are precomputed and
+stored in Recommendation so the API only reads them.
+
+X and C are persisted (RECOMMENDER_STATE_PATH) so that library changes
+can be applied incrementally: process_events() consumes InteractionEvent
+rows in batches, reloads the affected users' rows of X, updates C with
+C += X_new^T X_new - X_old^T X_old and rescores only those users.
+"""
+import os
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from scipy import sparse
+
+from .models import Favorite, InteractionEvent, Recommendation, UserPreference, WatchedHistory, Watchlist
+
+# Weight of each library signal in the interaction matrix
+FAVORITE_WEIGHT = 3.0
+LIKED_WEIGHT = 2.0
+WATCHED_WEIGHT = 1.0
+WATCHLIST_WEIGHT = 0.5
+DISLIKED_WEIGHT = -2.0
+
+
+def load_interactions(user_ids=None):
+    """
+    Return {(user_id, movie_id): weight} summing every library signal.
+    Pass user_ids to only load those users.
+    """
+    def rows(queryset):
+        if user_ids is not None:
+            queryset = queryset.filter(user__in=user_ids)
+        return queryset.values_list("user_id", "movie_id")
+
+    interactions = defaultdict(float)
+    for queryset, weight in (
+        (Favorite.objects.all(), FAVORITE_WEIGHT),
+        (WatchedHistory.objects.all(), WATCHED_WEIGHT),
+        (Watchlist.objects.all(), WATCHLIST_WEIGHT),
+        (UserPreference.objects.filter(liked=True), LIKED_WEIGHT),
+        (UserPreference.objects.filter(disliked=True), DISLIKED_WEIGHT),
+    ):
+        for key in rows(queryset):
+            interactions[key] += weight
+    return interactions
+
+
+def build_matrix(interactions):
+    """
+    Return (X, user_ids, movie_ids) where X is a CSR user x movie matrix
+    and user_ids / movie_ids map its rows / columns back to ids.
+    """
+    user_ids = sorted({user_id for user_id, _ in interactions})
+    movie_ids = sorted({movie_id for _, movie_id in interactions})
+    user_index = {user_id: i for i, user_id in enumerate(user_ids)}
+    movie_index = {movie_id: j for j, movie_id in enumerate(movie_ids)}
+    rows = np.fromiter((user_index[u] for u, _ in interactions), dtype=np.int32, count=len(interactions))
+    cols = np.fromiter((movie_index[m] for _, m in interactions), dtype=np.int32, count=len(interactions))
+    data = np.fromiter(interactions.values(), dtype=np.float32, count=len(interactions))
+    X = sparse.csr_matrix((data, (rows, cols)), shape=(len(user_ids), len(movie_ids)))
+    return X, user_ids, movie_ids
+
+
+def cooccurrence(X):
+    """
+    Movie x movie co-occurrence matrix C = X^T X.
+    """
+    return (X.T @ X).astype(np.float64).tocsr()
+
+
+def inverse_norms(C):
+    """
+    1 / ||column|| of X for every movie, read off the diagonal of C.
+    """
+    diagonal = C.diagonal()
+    with np.errstate(divide="ignore"):
+        return np.where(diagonal > 0, 1 / np.sqrt(diagonal), 0).astype(np.float32)
+
+
+def score_users(X_rows, C, inv_norms):
+    """
+    Sparse (users x movies) scores for the given rows of X:
+    X_rows . S with S the cosine similarity D^-1/2 C D^-1/2.
+    Movies the user already interacted with are left out.
+    """
+    scaled = X_rows.multiply(inv_norms[np.newaxis, :]).tocsr()
+    scores = (scaled @ C).multiply(inv_norms[np.newaxis, :]).tocsr()
+    scores = (scores - scores.multiply(X_rows != 0)).tocsr()
+    scores.eliminate_zeros()
+    return scores
+
+
+def top_n(scores, n):
+    """
+    [(column, score), ...] of the n best positive scores of each row of
+    a CSR score matrix, best first.
+    """
+    results = []
+    for i in range(scores.shape[0]):
+        start, end = scores.indptr[i], scores.indptr[i + 1]
+        columns, values = scores.indices[start:end], scores.data[start:end]
+        positive = values > 0
+        columns, values = columns[positive], values[positive]
+        if len(values) > n:
+            best = np.argpartition(-values, n - 1)[:n]
+            columns, values = columns[best], values[best]
+        order = np.argsort(-values, kind="stable")
+        results.append([(int(columns[k]), float(values[k])) for k in order])
+    return results
+
+
+def save_recommendations(recommendations):
+    """
+    Replace the stored recommendations of every user in
+    {user_id: [(movie_id, score), ...]} with one DELETE and one bulk INSERT.
+    """
+    with transaction.atomic():
+        Recommendation.objects.filter(user__in=list(recommendations)).delete()
+        Recommendation.objects.bulk_create(
+            [
+                Recommendation(user_id=user_id, movie_id=movie_id, score=score)
+                for user_id, items in recommendations.items()
+                for movie_id, score in items
+            ],
+            batch_size=1000,
+        )
+
+
+class RecommenderState:
+    """
+    Interaction matrix X, co-occurrence matrix C and the ids of their
+    rows and columns, persisted between runs as one .npz file.
+    """
+
+    def __init__(self, X, C, user_ids, movie_ids):
+        self.X = X
+        self.C = C
+        self.user_ids = list(user_ids)
+        self.movie_ids = list(movie_ids)
+        self.user_index = {user_id: i for i, user_id in enumerate(self.user_ids)}
+        self.movie_index = {movie_id: j for j, movie_id in enumerate(self.movie_ids)}
+
+    @classmethod
+    def build(cls):
+        X, user_ids, movie_ids = build_matrix(load_interactions())
+        return cls(X, cooccurrence(X), user_ids, movie_ids)
+
+    @classmethod
+    def load(cls, path=None):
+        """
+        Load the saved state, or return None if there is none.
+        """
+        path = Path(path or settings.RECOMMENDER_STATE_PATH)
+        if not path.exists():
+            return None
+        with np.load(path, allow_pickle=False) as f:
+            X = sparse.csr_matrix((f["X_data"], f["X_indices"], f["X_indptr"]), shape=tuple(f["X_shape"]))
+            C = sparse.csr_matrix((f["C_data"], f["C_indices"], f["C_indptr"]), shape=tuple(f["C_shape"]))
+            return cls(X, C, f["user_ids"].tolist(), f["movie_ids"].tolist())
+
+    def save(self, path=None):
+        """
+        Write the state atomically (temporary file + rename).
+        """
+        path = Path(path or settings.RECOMMENDER_STATE_PATH)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                X_data=self.X.data, X_indices=self.X.indices, X_indptr=self.X.indptr, X_shape=self.X.shape,
+                C_data=self.C.data, C_indices=self.C.indices, C_indptr=self.C.indptr, C_shape=self.C.shape,
+                user_ids=np.array(self.user_ids, dtype=np.int64),
+                movie_ids=np.array(self.movie_ids, dtype=str),
+            )
+        os.replace(tmp_path, path)
+
+    def _grow(self, user_ids, movie_ids):
+        for user_id in user_ids:
+            if user_id not in self.user_index:
+                self.user_index[user_id] = len(self.user_ids)
+                self.user_ids.append(user_id)
+        for movie_id in movie_ids:
+            if movie_id not in self.movie_index:
+                self.movie_index[movie_id] = len(self.movie_ids)
+                self.movie_ids.append(movie_id)
+        self.X.resize((len(self.user_ids), len(self.movie_ids)))
+        self.C.resize((len(self.movie_ids), len(self.movie_ids)))
+
+    def update_users(self, user_ids):
+        """
+        Reload the interactions of user_ids and update X and C in place.
+        Returns the row indexes of those users.
+        """
+        interactions = load_interactions(user_ids)
+        self._grow(user_ids, {movie_id for _, movie_id in interactions})
+        rows = np.array([self.user_index[user_id] for user_id in user_ids], dtype=np.int32)
+
+        X_new = sparse.csr_matrix(
+            (
+                np.fromiter(interactions.values(), dtype=np.float32, count=len(interactions)),
+                (
+                    np.fromiter((self.user_index[u] for u, _ in interactions), dtype=np.int32, count=len(interactions)),
+                    np.fromiter((self.movie_index[m] for _, m in interactions), dtype=np.int32, count=len(interactions)),
+                ),
+            ),
+            shape=self.X.shape,
+        )
+        # Zero out the old rows of the affected users.
+        keep = np.ones(self.X.shape[0], dtype=np.float32)
+        keep[rows] = 0
+        X_old = self.X - sparse.diags(keep) @ self.X
+
+        self.C = (self.C + cooccurrence(X_new) - cooccurrence(X_old)).tocsr()
+        # Drop the floating point residue of pairs that no longer co-occur.
+        self.C.data[np.abs(self.C.data) < 1e-9] = 0
+        self.C.eliminate_zeros()
+        self.X = (self.X - X_old + X_new).tocsr()
+        self.X.eliminate_zeros()
+        return rows
+
+    def recommend(self, rows, n):
+        """
+        Return {user_id: [(movie_id, score), ...]} for the given rows of X.
+        """
+        scores = score_users(self.X[rows], self.C, inverse_norms(self.C))
+        return {
+            self.user_ids[row]: [(self.movie_ids[j], score) for j, score in items]
+            for row, items in zip(rows, top_n(scores, n))
+        }
+
+
+def delete_events(event_ids, batch_size=1000):
+    """
+    Delete exactly the given InteractionEvent rows. Deleting by id range
+    instead would drop events committed late with a lower id, unread.
+    """
+    for start in range(0, len(event_ids), batch_size):
+        InteractionEvent.objects.filter(id__in=event_ids[start:start + batch_size]).delete()
+
+
+def build_recommendations(n=None, batch_size=1000):
+    """
+    Rebuild the recommender state from scratch, save it and store the
+    top-n recommendations of every user with library activity. Users
+    without any activity left lose their stored recommendations.
+    Returns the number of users processed.
+    """
+    n = n or settings.RECOMMENDATIONS_TOP_N
+    # Events visible before the rebuild reads the library are covered by it.
+    event_ids = list(InteractionEvent.objects.values_list("id", flat=True))
+    state = RecommenderState.build()
+    for start in range(0, len(state.user_ids), batch_size):
+        save_recommendations(state.recommend(np.arange(start, min(start + batch_size, len(state.user_ids))), n))
+    inactive = sorted(set(Recommendation.objects.values_list("user_id", flat=True).distinct()) - set(state.user_ids))
+    for start in range(0, len(inactive), batch_size):
+        Recommendation.objects.filter(user__in=inactive[start:start + batch_size]).delete()
+    state.save()
+    delete_events(event_ids)
+    return len(state.user_ids)
+
+
+def process_events(batch_size=1000, n=None):
+    """
+    Consume up to batch_size InteractionEvent rows: update the saved
+    state for the users they touch and refresh only those users'
+    recommendations. Falls back to a full rebuild when no state has
+    been saved yet. Returns the number of events consumed.
+
+    Only one worker should run at a time. Events are deleted after the
+    state is saved; a crash in between replays them, which is harmless
+    because users are reloaded from the database, not patched by delta.
+    """
+    n = n or settings.RECOMMENDATIONS_TOP_N
+    events = list(InteractionEvent.objects.order_by("id").values_list("id", "user_id")[:batch_size])
+    if not events:
+        return 0
+    state = RecommenderState.load()
+    if state is None:
+        build_recommendations(n)
+    else:
+        user_ids = sorted({user_id for _, user_id in events})
+        rows = state.update_users(user_ids)
+        save_recommendations(state.recommend(rows, n))
+        state.save()
+    delete_events([event_id for event_id, _ in events])
+    return len(events)
@@ -0,0 +1,31 @@
+"""
+orjson-based JSON renderer.
+"""
+import orjson
+from rest_framework.renderers import JSONRenderer
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson. The output decodes to the same
+    values as JSONRenderer's with the default settings (compact, UTF-8),
+    except that NaN and Infinity become null instead of raising; floats
+    may be spelled differently (1e-7 rather than 1e-07). Indented output
+    (the browsable API, ?indent) and non-default UNICODE_JSON /
+    COMPACT_JSON settings go through JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.ensure_ascii or not self.compact or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        encoder = self.encoder_class()
+        ret = orjson.dumps(
+            data,
+            default=encoder.default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS,
+        )
+        # Same escaping as JSONRenderer: keep the output a strict JavaScript subset.
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
@@ -0,0 +1,93 @@
+"""
+Read-replica routing for the library read endpoints.
+
+Reads are sent to a replica only inside replica_reads(user_id), which
+the library helpers open around their list/lookup queries; everything
+else, and every write, uses the primary ("default"). Replicas lag
+behind the primary, so after a library write library_changed() calls
+stick_to_primary(), and the user's reads stay on the primary for
+DB_REPLICA_STICKY_SECONDS (read-your-writes). The window is shared
+through CACHES; with a process-local cache it could not reach the
+other workers, so all reads stay on the primary instead.
+
+Replicas are the aliases listed in DATABASE_REPLICAS. Locally, declare
+a second SQLite alias for the same database file to exercise the
+routing without real replication.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from . import metrics
+from .checks import cache_is_shared
+
+_replica = ContextVar("replica", default=None)
+
+
+def _sticky_key(user_id):
+    return f"db:sticky:{user_id}"
+
+
+def stick_to_primary(user_id):
+    """
+    Keep the user's replica_reads() on the primary for
+    DB_REPLICA_STICKY_SECONDS. Call once a write has committed.
+    """
+    if settings.DATABASE_REPLICAS and cache_is_shared():
+        cache.set(_sticky_key(user_id), True, settings.DB_REPLICA_STICKY_SECONDS)
+
+
+@contextmanager
+def replica_reads(user_id):
+    """
+    Route the reads made inside the block to a replica, unless the user
+    wrote recently (see stick_to_primary()), no replica is configured
+    or the cache is process-local.
+    """
+    if not settings.DATABASE_REPLICAS or not cache_is_shared():
+        yield
+        return
+    if cache.get(_sticky_key(user_id)):
+        metrics.incr("db.reads.sticky")
+        yield
+        return
+    metrics.incr("db.reads.replica")
+    token = _replica.set(random.choice(settings.DATABASE_REPLICAS))
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Sends reads made inside replica_reads() to the chosen replica and
+    everything else to the primary. Replicas get their schema through
+    replication, so migrations only run on the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        replica = _replica.get()
+        # Reads inside a transaction on the primary must see its writes.
+        if replica is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        # Explicit, so saving a row loaded from a replica writes to the primary.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
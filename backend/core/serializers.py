@@ -1,7 +1,10 @@
 from django.contrib.auth.models import User
 from rest_framework import serializers
 from django.contrib.auth import authenticate, get_user_model
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from django.contrib.auth.models import update_last_login
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from .tokens import RevocableRefreshToken
 
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -23,29 +26,53 @@ User = get_user_model()
 
 class LoginSerializer(TokenObtainPairSerializer):
     username_field = User.USERNAME_FIELD
+    token_class = RevocableRefreshToken
+
+    @classmethod
+    def get_token(cls, user):
+        """
+        Embed the username for core.authentication.StatelessJWTAuthentication.
+        Privileges are not embedded: they are looked up per account.
+        """
+        token = super().get_token(user)
+        token["username"] = user.get_username()
+        return token
 
     def validate(self, attrs):
-        username_or_email = attrs.get("username")
-        password = attrs.get("password")
-
-        user = authenticate(username=username_or_email, password=password)
-
-        if user is None:
-            try:
-                user_obj = User.objects.get(email=username_or_email)
-                user = authenticate(username=user_obj.username, password=password)
-            except User.DoesNotExist:
-                pass
-
+        """
+        Authenticate once (username or email, see core.backends) and
+        issue the token pair for that user. TokenObtainPairSerializer's
+        own validate() is not called: it would authenticate, and hash
+        the password, a second time.
+        """
+        user = authenticate(
+            self.context.get("request"),
+            username=attrs.get("username"),
+            password=attrs.get("password"),
+        )
         if user is None or not user.is_active:
             raise serializers.ValidationError("Invalid login credentials")
 
-        data = super().validate({"username": user.username, "password": password})
-        data["username"] = user.username
-        data["email"] = user.email
-        return data
-    
-from rest_framework import serializers
+        self.user = user
+        refresh = self.get_token(user)
+        if jwt_settings.UPDATE_LAST_LOGIN:
+            update_last_login(None, user)
+        return {
+            "refresh": str(refresh),
+            "access": str(refresh.access_token),
+            "username": user.username,
+            "email": user.email,
+        }
+
+class RefreshSerializer(TokenRefreshSerializer):
+    token_class = RevocableRefreshToken
+
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
 from .models import Watchlist, Favorite, WatchedHistory, UserPreference, Recommendation
 
 class WatchlistSerializer(serializers.ModelSerializer):
@@ -72,3 +99,69 @@ class RecommendationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Recommendation
         fields = '__all__'
+
+
+#! Fields whose to_representation() is the identity for values read from the database
+PASSTHROUGH_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.ChoiceField,
+    serializers.FloatField,
+    serializers.IntegerField,
+    serializers.PrimaryKeyRelatedField,
+)
+
+
+class ValuesSerializer:
+    """
+    Read-only fast path for the list endpoints of a ModelSerializer.
+    Reads rows with .values() and converts only the columns that need it
+    (dates and datetimes), giving the same dicts, with keys in the same
+    order, as serializer_class(rows, many=True).data without building
+    model instances or running DRF's per-field machinery.
+    """
+
+    def __init__(self, serializer_class):
+        self.fields = []
+        self.converters = []
+        for name, field in serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if field.source != name:
+                raise ValueError(f"{serializer_class.__name__}.{name}: only plain model fields are supported")
+            self.fields.append(name)
+            if isinstance(field, serializers.DateTimeField):
+                output_format = getattr(field, "format", api_settings.DATETIME_FORMAT)
+                iso = isinstance(output_format, str) and output_format.lower() == ISO_8601
+                self.converters.append((name, field, iso and not hasattr(field, "timezone")))
+            elif not isinstance(field, PASSTHROUGH_FIELDS):
+                self.converters.append((name, field, False))
+
+    def rows(self, queryset):
+        """
+        queryset as .values() dicts holding exactly the serialized fields.
+        """
+        return queryset.values(*self.fields)
+
+    def data(self, rows):
+        """
+        Convert .values() dicts in place and return them.
+        """
+        tz = timezone.get_current_timezone() if settings.USE_TZ else None
+        for name, field, iso_datetime in self.converters:
+            if iso_datetime and tz is not None:
+                for row in rows:
+                    value = row[name]
+                    if value:
+                        value = value.astimezone(tz).isoformat()
+                        row[name] = value[:-6] + "Z" if value.endswith("+00:00") else value
+            else:
+                for row in rows:
+                    if row[name] is not None:
+                        row[name] = field.to_representation(row[name])
+        return rows
+
+
+@lru_cache(maxsize=None)
+def values_serializer(serializer_class):
+    return ValuesSerializer(serializer_class)
@@ -0,0 +1,174 @@
+"""
+Content-based "similar movies" index.
+
+Every Movie row becomes a feature vector: multi-hot genres, multi-hot
+top cast, and the rating and release year scaled to [0, 1]. Vectors are
+L2-normalized, so the dot product of two rows is their cosine
+similarity. The k nearest neighbours of every movie are precomputed and
+written as .npy files that are memory-mapped at query time, so lookups
+need no network I/O and almost no memory.
+
+Layout of SIMILARITY_INDEX_DIR:
+    CURRENT                  name of the active build directory
+    <build>/movie_ids.npy    TMDb ids, row i of the arrays below
+    <build>/neighbours.npy   int32 (movies x k) row indexes, best first
+    <build>/scores.npy       float32 (movies x k) cosine similarities
+"""
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from scipy import sparse
+
+from .models import Movie
+
+GENRE_WEIGHT = 1.0
+CAST_WEIGHT = 0.6
+RATING_WEIGHT = 0.3
+YEAR_WEIGHT = 0.3
+
+_loaded = None  # (build name, {movie_id: row}, movie_ids, neighbours, scores)
+_loaded_lock = threading.Lock()
+
+
+def _vocabulary(values):
+    return {value: i for i, value in enumerate(sorted(set(values), key=str))}
+
+
+def build_features(movies):
+    """
+    Return the CSR feature matrix of movies, one L2-normalized row each.
+    """
+    genres = _vocabulary(g for movie in movies for g in movie.genres)
+    cast = _vocabulary(c for movie in movies for c in movie.cast)
+    years = [movie.release_date.year for movie in movies if movie.release_date]
+    min_year, max_year = (min(years), max(years)) if years else (0, 0)
+    year_span = max(max_year - min_year, 1)
+
+    genre_offset, cast_offset = 0, len(genres)
+    rating_column, year_column = cast_offset + len(cast), cast_offset + len(cast) + 1
+    rows, cols, data = [], [], []
+
+    def add(row, column, value):
+        rows.append(row)
+        cols.append(column)
+        data.append(value)
+
+    for i, movie in enumerate(movies):
+        for g in movie.genres:
+            add(i, genre_offset + genres[g], GENRE_WEIGHT)
+        for c in movie.cast:
+            add(i, cast_offset + cast[c], CAST_WEIGHT)
+        if movie.rating is not None:
+            add(i, rating_column, RATING_WEIGHT * movie.rating / 10)
+        if movie.release_date:
+            add(i, year_column, YEAR_WEIGHT * (movie.release_date.year - min_year) / year_span)
+
+    features = sparse.csr_matrix(
+        (np.array(data, dtype=np.float32), (rows, cols)),
+        shape=(len(movies), year_column + 1),
+    )
+    norms = np.sqrt(np.asarray(features.multiply(features).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags(1 / norms).astype(np.float32) @ features
+
+
+def nearest_neighbours(features, k, block_size=256):
+    """
+    Return (neighbours, scores), the k most similar rows of every row
+    (itself excluded), computed block by block to bound memory.
+    """
+    n = features.shape[0]
+    k = min(k, max(n - 1, 0))
+    neighbours = np.zeros((n, k), dtype=np.int32)
+    scores = np.zeros((n, k), dtype=np.float32)
+    if k == 0:
+        return neighbours, scores
+    transposed = features.T.tocsc()
+    for start in range(0, n, block_size):
+        block = np.asarray((features[start:start + block_size] @ transposed).todense(), dtype=np.float32)
+        block[np.arange(block.shape[0]), np.arange(start, start + block.shape[0])] = -np.inf
+        best = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(block, best, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        neighbours[start:start + block.shape[0]] = np.take_along_axis(best, order, axis=1)
+        scores[start:start + block.shape[0]] = np.take_along_axis(best_scores, order, axis=1)
+    return neighbours, scores
+
+
+def build_index(k=None, index_dir=None):
+    """
+    Build the index from every stored Movie and make it the active one.
+    Returns the number of movies indexed.
+    """
+    k = k or settings.SIMILARITY_NEIGHBOURS
+    index_dir = Path(index_dir or settings.SIMILARITY_INDEX_DIR)
+    movies = list(Movie.objects.only("movie_id", "genres", "cast", "rating", "release_date").order_by("id"))
+    neighbours, scores = nearest_neighbours(build_features(movies), k)
+
+    build = f"build-{time.time_ns()}"
+    build_dir = index_dir / build
+    build_dir.mkdir(parents=True)
+    np.save(build_dir / "movie_ids.npy", np.array([movie.movie_id for movie in movies], dtype=str))
+    np.save(build_dir / "neighbours.npy", neighbours)
+    np.save(build_dir / "scores.npy", scores)
+
+    current = index_dir / "CURRENT"
+    previous = current.read_text().strip() if current.exists() else None
+    tmp = index_dir / "CURRENT.tmp"
+    tmp.write_text(build)
+    os.replace(tmp, current)
+    # Processes that still map the previous build keep their open files.
+    for old in index_dir.glob("build-*"):
+        if old.name not in (build, previous):
+            shutil.rmtree(old, ignore_errors=True)
+    return len(movies)
+
+
+def load_index(index_dir=None):
+    """
+    Return (movie index, movie_ids, neighbours, scores) of the active
+    build, memory-mapped and cached per process, or None if no index
+    has been built.
+    """
+    global _loaded
+    index_dir = Path(index_dir or settings.SIMILARITY_INDEX_DIR)
+    current = index_dir / "CURRENT"
+    if not current.exists():
+        return None
+    build = current.read_text().strip()
+    with _loaded_lock:
+        if _loaded is None or _loaded[0] != build:
+            build_dir = index_dir / build
+            movie_ids = np.load(build_dir / "movie_ids.npy", mmap_mode="r")
+            _loaded = (
+                build,
+                {movie_id: i for i, movie_id in enumerate(movie_ids.tolist())},
+                movie_ids,
+                np.load(build_dir / "neighbours.npy", mmap_mode="r"),
+                np.load(build_dir / "scores.npy", mmap_mode="r"),
+            )
+        return _loaded[1:]
+
+
+def similar_movies(movie_id, limit=10):
+    """
+    Return [(movie_id, score), ...] of the movies most similar to
+    movie_id, or None if it is not in the index (or there is no index).
+    """
+    index = load_index()
+    if index is None:
+        return None
+    rows, movie_ids, neighbours, scores = index
+    row = rows.get(str(movie_id))
+    if row is None:
+        return None
+    return [
+        (str(movie_ids[j]), float(score))
+        for j, score in zip(neighbours[row][:limit], scores[row][:limit])
+        if score > 0
+    ]
@@ -0,0 +1,76 @@
+"""
+Pre-serialized JSON snapshots of expensive payloads.
+
+The detailed popular movies list is rebuilt outside the request cycle
+(see the refresh_popular_snapshot management command) and stored as a
+JSON blob that MoviesWithDetailsView serves as-is. A failed rebuild
+leaves the last good snapshot in place.
+"""
+import hashlib
+import json
+import threading
+
+from django.utils import timezone
+
+from .metadata import store_movies
+from .models import Snapshot
+from .tmdb import fetch_popular_detailed
+
+POPULAR_SNAPSHOT = "popular"
+POPULAR_SNAPSHOT_SIZE = 50
+
+# name -> Snapshot, so the payload is only read from the database when
+# a newer snapshot has been built.
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+
+def save_snapshot(name, data):
+    """
+    Serialize data and store it as the current snapshot called name.
+    """
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    snapshot, _ = Snapshot.objects.update_or_create(
+        name=name,
+        defaults={
+            "payload": payload,
+            "etag": hashlib.sha1(payload.encode()).hexdigest(),
+            "built_at": timezone.now(),
+        },
+    )
+    with _loaded_lock:
+        _loaded[name] = snapshot
+    return snapshot
+
+
+def get_snapshot(name):
+    """
+    Return the latest Snapshot called name, or None if it was never built.
+    """
+    latest = Snapshot.objects.filter(name=name).values("etag").first()
+    if latest is None:
+        return None
+    with _loaded_lock:
+        snapshot = _loaded.get(name)
+    if snapshot is None or snapshot.etag != latest["etag"]:
+        snapshot = Snapshot.objects.filter(name=name).first()
+        with _loaded_lock:
+            _loaded[name] = snapshot
+    return snapshot
+
+
+def refresh_popular_snapshot():
+    """
+    Rebuild the detailed popular movies snapshot from TMDb.
+    Raises requests.exceptions.RequestException if TMDb fails, in which
+    case the previous snapshot is kept.
+    """
+    return store_popular_snapshot(fetch_popular_detailed(limit=POPULAR_SNAPSHOT_SIZE))
+
+
+def store_popular_snapshot(movies):
+    """
+    Store already fetched detailed popular movies as the snapshot.
+    """
+    store_movies(movies)
+    return save_snapshot(POPULAR_SNAPSHOT, movies)
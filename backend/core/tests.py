@@ -1,3 +1,1471 @@
-from django.test import TestCase
+import asyncio
+import base64
+import json
+import math
+import os
+import runpy
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import httpx
+import requests
+import urllib3
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connection, connections, router, transaction
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import tmdb, tmdb_async
+from .authentication import StatelessJWTAuthentication
+from .cache import LocMemBackend, RedisBackend, TMDbCache, build_cache
+from .checks import check_cache_is_shared, check_tmdb_cache_backend
+from .coalesce import Coalescer
+from .library import STATE_DISLIKED, STATE_FAVORITE, STATE_LIKED, STATE_WATCHED, STATE_WATCHLIST
+from .library import library_state, remove_library_row, upsert_library_row
+from .metadata import fetch_movies
+from .models import (
+    Favorite, InteractionEvent, Movie, Recommendation, Snapshot, UserPreference, WatchedHistory, Watchlist,
+)
+from .recommender import RecommenderState, build_recommendations, process_events
+from .renderers import ORJSONRenderer
+from .routers import replica_reads, stick_to_primary
+from .similarity import build_index
+from .snapshot import POPULAR_SNAPSHOT, POPULAR_SNAPSHOT_SIZE
+from .serializers import (
+    FavoriteSerializer, RecommendationSerializer, UserPreferenceSerializer, WatchedHistorySerializer,
+    WatchlistSerializer, values_serializer,
+)
+from . import tokens
+from .tmdb import TMDB_MAX_PAGE, popular_pages
+from .tokens import BloomFilter, RevocationSet
+
+
+def shared_cache(test):
+    """
+    Point CACHES at a file-based cache, which counts as shared between
+    processes, for the duration of a test.
+    """
+    tmp = tempfile.TemporaryDirectory()
+    test.addCleanup(tmp.cleanup)
+    settings_override = override_settings(CACHES={
+        "default": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": tmp.name},
+    })
+    settings_override.enable()
+    test.addCleanup(settings_override.disable)
+
+
+class TMDbAdapter(requests.adapters.BaseAdapter):
+    """
+    requests transport that answers from an httpx handler, so one fake
+    TMDb serves both the threaded and the async client.
+    """
+
+    def __init__(self, handler):
+        super().__init__()
+        self.handler = handler
+
+    def send(self, request, **kwargs):
+        reply = self.handler(httpx.Request(request.method, request.url))
+        response = requests.Response()
+        response.status_code = reply.status_code
+        response.headers = requests.structures.CaseInsensitiveDict(reply.headers)
+        response._content = reply.content
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def mock_tmdb(test, handler):
+    """
+    Answer the TMDb calls made during a test with handler(httpx.Request),
+    which returns an httpx.Response, behind a fresh response cache and a
+    rate limit that earlier tests have not used up. A coroutine function
+    only serves the async client.
+    """
+    session = requests.Session()
+    session.mount("https://", TMDbAdapter(handler))
+    build_client = tmdb_async.build_client
+    cache = build_cache(settings.TMDB_CACHE)
+    patchers = [
+        mock.patch.object(tmdb, "_session", session),
+        mock.patch.object(tmdb, "_rate_limiter", tmdb.RateLimiter(rate=1000, burst=1000)),
+        mock.patch.object(
+            tmdb_async, "build_client",
+            lambda **kwargs: build_client(transport=httpx.MockTransport(handler), **kwargs),
+        ),
+        mock.patch.object(tmdb, "get_tmdb_cache", lambda: cache),
+        mock.patch.object(tmdb_async, "get_tmdb_cache", lambda: cache),
+    ]
+    for patcher in patchers:
+        patcher.start()
+        test.addCleanup(patcher.stop)
+
+
+def matrix_entries(matrix, row_ids, column_ids):
+    """
+    {(row id, column id): value} of the non-zero entries of a sparse matrix.
+    """
+    coo = matrix.tocoo()
+    return {
+        (row_ids[i], column_ids[j]): round(float(value), 6)
+        for i, j, value in zip(coo.row, coo.col, coo.data)
+        if abs(value) > 1e-9
+    }
+
+
+class RecommenderTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings_override = override_settings(RECOMMENDER_STATE_PATH=str(Path(tmp.name) / "state.npz"))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.alice = User.objects.create_user("alice")
+        self.bob = User.objects.create_user("bob")
+        self.carol = User.objects.create_user("carol")
+        for user, movies in ((self.alice, "123"), (self.bob, "1234"), (self.carol, "34")):
+            for movie_id in movies:
+                upsert_library_row(Favorite, user.id, movie_id)
+        upsert_library_row(Watchlist, self.alice.id, "5")
+        upsert_library_row(UserPreference, self.bob.id, "5", disliked=True)
+
+    def test_incremental_update_matches_full_rebuild(self):
+        build_recommendations()
+        state = RecommenderState.load()
+
+        remove_library_row(Favorite, self.alice.id, "1")
+        upsert_library_row(WatchedHistory, self.alice.id, "6")
+        upsert_library_row(Favorite, self.carol.id, "1")
+        dave = User.objects.create_user("dave")
+        upsert_library_row(Favorite, dave.id, "6")
+        state.update_users([self.alice.id, self.carol.id, dave.id])
+
+        rebuilt = RecommenderState.build()
+        self.assertEqual(
+            matrix_entries(state.X, state.user_ids, state.movie_ids),
+            matrix_entries(rebuilt.X, rebuilt.user_ids, rebuilt.movie_ids),
+        )
+        self.assertEqual(
+            matrix_entries(state.C, state.movie_ids, state.movie_ids),
+            matrix_entries(rebuilt.C, rebuilt.movie_ids, rebuilt.movie_ids),
+        )
+
+    def test_full_rebuild_drops_users_without_activity(self):
+        build_recommendations()
+        self.assertTrue(Recommendation.objects.filter(user=self.alice).exists())
+        for movie_id in "123":
+            remove_library_row(Favorite, self.alice.id, movie_id)
+        remove_library_row(Watchlist, self.alice.id, "5")
+        build_recommendations()
+        self.assertFalse(Recommendation.objects.filter(user=self.alice).exists())
+        self.assertTrue(Recommendation.objects.filter(user=self.carol).exists())
+
+    def test_process_events_deletes_only_the_events_it_read(self):
+        build_recommendations()
+        self.assertFalse(InteractionEvent.objects.exists())
+        upsert_library_row(Favorite, self.alice.id, "4")
+        upsert_library_row(Favorite, self.carol.id, "1")
+        _, second = InteractionEvent.objects.order_by("id").values_list("id", flat=True)
+
+        self.assertEqual(process_events(batch_size=1), 1)
+        self.assertEqual(list(InteractionEvent.objects.values_list("id", flat=True)), [second])
+        self.assertNotIn("4", Recommendation.objects.filter(user=self.alice).values_list("movie_id", flat=True))
+        self.assertEqual(process_events(batch_size=1), 1)
+        self.assertEqual(process_events(), 0)
+
+    def test_process_events_without_state_rebuilds_and_consumes(self):
+        pending = InteractionEvent.objects.count()
+        self.assertEqual(process_events(batch_size=pending + 10), pending)
+        self.assertFalse(InteractionEvent.objects.exists())
+        self.assertIsNotNone(RecommenderState.load())
+
+
+class LibraryStateTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("alice")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        upsert_library_row(Watchlist, self.user.id, "1")
+        upsert_library_row(Favorite, self.user.id, "1")
+        upsert_library_row(WatchedHistory, self.user.id, "2")
+        upsert_library_row(UserPreference, self.user.id, "2", liked=True)
+        upsert_library_row(UserPreference, self.user.id, "3", disliked=True)
+        upsert_library_row(UserPreference, self.user.id, "4")  # neither liked nor disliked
+        other = User.objects.create_user("bob")
+        upsert_library_row(Favorite, other.id, "5")
+
+    def test_bitmask_combines_every_table(self):
+        with self.assertNumQueries(1):
+            states = library_state(self.user.id, ["1", "2", "3", "4", "5", "1"])
+        self.assertEqual(states, {
+            "1": STATE_WATCHLIST | STATE_FAVORITE,
+            "2": STATE_WATCHED | STATE_LIKED,
+            "3": STATE_DISLIKED,
+            "4": 0,
+            "5": 0,
+        })
+
+    def test_endpoint(self):
+        response = self.client.get(reverse("library-state"), {"ids": "1, 3,"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["states"], {"1": STATE_WATCHLIST | STATE_FAVORITE, "3": STATE_DISLIKED})
+        self.assertEqual(self.client.get(reverse("library-state")).status_code, 400)
+
+    def test_process_local_cache_is_bypassed(self):
+        self.assertEqual([warning.id for warning in check_cache_is_shared(None)], ["core.W001"])
+        library_state(self.user.id, ["5"])
+        Favorite.objects.create(user=self.user, movie_id="5")  # bypasses library_changed()
+        self.assertEqual(library_state(self.user.id, ["5"]), {"5": STATE_FAVORITE})
+
+    def test_shared_cache_is_invalidated_on_write(self):
+        shared_cache(self)
+        self.addCleanup(cache.clear)
+        self.assertEqual(check_cache_is_shared(None), [])
+        self.assertEqual(library_state(self.user.id, ["5"]), {"5": 0})
+        with self.assertNumQueries(0):
+            library_state(self.user.id, ["5"])
+        with self.captureOnCommitCallbacks(execute=True):
+            upsert_library_row(Favorite, self.user.id, "5")
+        self.assertEqual(library_state(self.user.id, ["5"]), {"5": STATE_FAVORITE})
+
+
+class BloomFilterTests(TestCase):
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(2000, 0.01)
+        items = [uuid.uuid4().hex for _ in range(2000)]
+        for item in items:
+            bloom.add(item)
+        self.assertTrue(all(item in bloom for item in items))
+
+    def test_false_positive_rate_is_bounded(self):
+        bloom = BloomFilter(2000, 0.01)
+        for _ in range(2000):
+            bloom.add(uuid.uuid4().hex)
+        false_positives = sum(uuid.uuid4().hex in bloom for _ in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class RefreshTokenRevocationTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(tokens, "revocations", RevocationSet())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        User.objects.create_user("alice", password="secret-password")
+        self.client = APIClient()
+
+    def login(self):
+        response = self.client.post(reverse("login"), {"username": "alice", "password": "secret-password"})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def refresh(self, token):
+        return self.client.post(reverse("token-refresh"), {"refresh": token})
+
+    def assert_rotation_rejects_reuse(self):
+        old = self.login()["refresh"]
+        response = self.refresh(old)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.refresh(old).status_code, 401)
+        self.assertEqual(self.refresh(response.json()["refresh"]).status_code, 200)
+
+    def test_rotate_then_reuse_is_rejected(self):
+        self.assert_rotation_rejects_reuse()
+
+    def test_rotate_then_reuse_is_rejected_with_shared_cache(self):
+        shared_cache(self)
+        self.assert_rotation_rejects_reuse()
+
+    def test_logged_out_token_is_rejected(self):
+        shared_cache(self)
+        pair = self.login()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {pair['access']}")
+        self.assertEqual(self.client.post(reverse("logout"), {"refresh": pair["refresh"]}).status_code, 205)
+        self.assertEqual(self.refresh(pair["refresh"]).status_code, 401)
+
+    def test_revocation_by_another_process_is_seen(self):
+        shared_cache(self)
+        self.addCleanup(cache.clear)
+        pair = self.login()
+        self.assertEqual(self.refresh(self.login()["refresh"]).status_code, 200)  # builds the filter
+        # Another worker blacklists the token: only the database and the cache know.
+        with mock.patch.object(tokens, "revocations", RevocationSet()):
+            tokens.RevocableRefreshToken(pair["refresh"]).blacklist()
+        self.assertEqual(self.refresh(pair["refresh"]).status_code, 401)
+
+    def test_first_check_on_a_freshly_booted_host(self):
+        shared_cache(self)
+        pair = self.login()
+        with mock.patch("core.tokens.time.monotonic", return_value=1.0):
+            self.assertEqual(self.refresh(pair["refresh"]).status_code, 200)
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class LoginTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user("alice", "Alice@example.com", "secret")
+
+    def login(self, username, password="secret"):
+        return self.client.post(reverse("login"), {"username": username, "password": password})
+
+    def test_username_or_email(self):
+        for login in ("alice", "alice@example.com", "ALICE@example.COM"):
+            with self.subTest(login=login):
+                response = self.login(login)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()["username"], "alice")
+                self.assertIn("access", response.json())
+
+    def test_one_query_per_lookup(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(authenticate(username="alice@example.com", password="secret"), self.alice)
+        with self.assertNumQueries(1):
+            self.assertIsNone(authenticate(username="nobody", password="secret"))
+
+    def test_rejected_logins(self):
+        User.objects.create_user("carol", "shared@example.com", "secret")
+        User.objects.create_user("dave", "shared@example.com", "secret")
+        User.objects.create_user("erin", is_active=False, password="secret")
+        for username, password in (
+            ("alice", "wrong"), ("nobody", "secret"), ("shared@example.com", "secret"), ("erin", "secret"),
+        ):
+            with self.subTest(username=username):
+                self.assertEqual(self.login(username, password).status_code, 400)
+
+    def test_username_match_wins_over_email(self):
+        impostor = User.objects.create_user("alice@example.com", "impostor@example.com", "other")
+        self.assertEqual(authenticate(username="alice@example.com", password="other"), impostor)
+        self.assertIsNone(authenticate(username="alice@example.com", password="secret"))
+
+
+class StatelessJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user("alice", is_staff=True)
+
+    def authenticate(self, token):
+        request = RequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {token}")
+        user, _ = StatelessJWTAuthentication().authenticate(request)
+        return user
+
+    def test_user_is_built_without_loading_the_row_again(self):
+        token = AccessToken.for_user(self.user)
+        self.authenticate(token)
+        with self.assertNumQueries(0):
+            user = self.authenticate(token)
+        self.assertEqual(user.id, self.user.id)
+        self.assertTrue(user.is_staff)
+        self.assertFalse(user.is_superuser)
+
+    def test_privileges_come_from_the_account_not_the_token(self):
+        token = AccessToken.for_user(self.user)
+        token["is_superuser"] = True
+        self.assertFalse(self.authenticate(token).is_superuser)
+        self.user.is_staff = False
+        self.user.save()
+        self.assertFalse(self.authenticate(token).is_staff)
+
+    def test_inactive_user_is_rejected(self):
+        token = AccessToken.for_user(self.user)
+        self.authenticate(token)
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+
+class LibraryRowTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("alice")
+
+    def test_upsert_updates_the_existing_row(self):
+        first = upsert_library_row(Watchlist, self.user.id, "1")
+        second = upsert_library_row(Watchlist, self.user.id, "1", status="watching")
+        self.assertEqual((second.pk, second.created_at, second.status), (first.pk, first.created_at, "watching"))
+        self.assertGreaterEqual(second.updated_at, first.updated_at)
+        self.assertEqual(Watchlist.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(InteractionEvent.objects.filter(user=self.user, source="watchlist").count(), 2)
+
+    def test_one_row_per_user_and_movie(self):
+        for model in (Watchlist, Favorite, WatchedHistory, UserPreference):
+            with self.subTest(model=model.__name__):
+                model.objects.create(user=self.user, movie_id="1")
+                with self.assertRaises(IntegrityError), transaction.atomic():
+                    model.objects.create(user=self.user, movie_id="1")
+                model.objects.create(user=User.objects.create_user(f"bob-{model.__name__}"), movie_id="1")
+
+    def test_remove(self):
+        upsert_library_row(Favorite, self.user.id, "1")
+        self.assertIs(remove_library_row(Favorite, self.user.id, "1"), True)
+        self.assertIs(remove_library_row(Favorite, self.user.id, "1"), False)
+        self.assertEqual(InteractionEvent.objects.filter(user=self.user, source="favorite").count(), 2)
+
+
+class LibraryExpansionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("alice")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for movie_id in ("1", "2", "3"):
+            upsert_library_row(Favorite, self.user.id, movie_id)
+        Movie.objects.create(
+            movie_id="1", title="Stored", genres=["Drama"], cast=[], runtime=120, fetched_at=timezone.now(),
+        )
+
+    def get(self, **params):
+        return self.client.get(reverse("get-favorites"), params)
+
+    def test_stored_and_fetched_movies_are_embedded(self):
+        def fetch(movie_ids):
+            self.assertEqual(sorted(movie_ids), ["2", "3"])
+            movie = Movie.objects.create(movie_id="2", title="Fetched", genres=[], cast=[], fetched_at=timezone.now())
+            return {"2": movie}  # 3 is unknown to TMDb
+
+        with mock.patch("core.library.fetch_movies", side_effect=fetch):
+            response = self.get(expand="movie")
+        movies = {row["movie_id"]: row["movie"] for row in response.json()["results"]}
+        self.assertEqual(movies["1"], {
+            "id": 1, "title": "Stored", "releaseDate": None, "rating": None, "runtime": 120,
+            "genres": ["Drama"], "poster": None,
+        })
+        self.assertEqual(movies["2"]["title"], "Fetched")
+        self.assertIsNone(movies["3"])
+
+    def test_tmdb_failure_leaves_missing_movies_null(self):
+        with mock.patch("core.library.fetch_movies", side_effect=requests.exceptions.ConnectionError):
+            response = self.get(expand="movie")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row["movie"] is None for row in response.json()["results"]], [True, True, False])
+
+    def test_not_expanded_by_default(self):
+        with mock.patch("core.library.fetch_movies") as fetch:
+            response = self.get()
+        fetch.assert_not_called()
+        self.assertNotIn("movie", response.json()["results"][0])
+
+
+class LibraryPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("alice")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for movie_id in range(1, 6):
+            upsert_library_row(Watchlist, self.user.id, str(movie_id))
+        # Rows 2-4 share a timestamp, so only the id orders them.
+        now = timezone.now()
+        rows = Watchlist.objects.filter(user=self.user)
+        rows.filter(movie_id="1").update(created_at=now - timedelta(days=1))
+        rows.filter(movie_id__in=["2", "3", "4"]).update(created_at=now)
+        rows.filter(movie_id="5").update(created_at=now + timedelta(days=1))
+
+    def get(self, **params):
+        return self.client.get(reverse("get-watchlist"), params)
+
+    def walk(self, **params):
+        pages = []
+        cursor = None
+        while True:
+            body = self.get(**params, **({"cursor": cursor} if cursor else {})).json()
+            pages.append([row["movie_id"] for row in body["results"]])
+            cursor = body["next"]
+            if cursor is None:
+                return pages
+
+    def test_pages_cover_every_row_once_newest_first(self):
+        self.assertEqual(self.walk(page_size=2), [["5", "4"], ["3", "2"], ["1"]])
+        self.assertEqual(self.walk(page_size=5), [["5", "4", "3", "2", "1"]])
+        self.assertEqual(self.walk(page_size=1), [["5"], ["4"], ["3"], ["2"], ["1"]])
+
+    def test_rows_added_between_pages_do_not_shift_the_next_page(self):
+        first = self.get(page_size=2).json()
+        upsert_library_row(Watchlist, self.user.id, "6")
+        second = self.get(page_size=2, cursor=first["next"]).json()
+        self.assertEqual([row["movie_id"] for row in second["results"]], ["3", "2"])
+
+    def test_filters_apply_to_every_page(self):
+        after = (timezone.now() - timedelta(hours=1)).isoformat()
+        self.assertEqual(self.walk(page_size=2, created_after=after), [["5", "4"], ["3", "2"]])
+        self.assertEqual(self.walk(page_size=2, created_before=date.today() - timedelta(days=1)), [["1"]])
+
+    def test_invalid_parameters(self):
+        bad_cursor = base64.urlsafe_b64encode(b"not a date|1").decode()
+        for params in (
+            {"cursor": "garbage"}, {"cursor": bad_cursor},
+            {"page_size": 0}, {"page_size": settings.LIBRARY_MAX_PAGE_SIZE + 1}, {"page_size": "x"},
+            {"created_after": "yesterday"}, {"created_before": "2026-13-45"},
+        ):
+            with self.subTest(params=params):
+                response = self.get(**params)
+                self.assertEqual(response.status_code, 400)
+
+
+class PreferencesTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("alice")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for movie_id, liked in (("1", True), ("2", False), ("3", True)):
+            self.set(movie_id, liked=liked, disliked=not liked)
+        upsert_library_row(UserPreference, User.objects.create_user("bob").id, "4", liked=True)
+
+    def set(self, movie_id, **fields):
+        return self.client.post(reverse("add_preference"), {"movie_id": movie_id, **fields}, format="json")
+
+    def test_set_is_an_upsert_and_liked_wins(self):
+        response = self.set("2", liked=True, disliked=True)
+        self.assertEqual((response.json()["liked"], response.json()["disliked"]), (True, False))
+        self.assertEqual(UserPreference.objects.filter(user=self.user, movie_id="2").count(), 1)
+        self.assertEqual(self.set("", liked=True).status_code, 400)
+
+    def test_list_and_ids_span_every_preference(self):
+        response = self.client.get(reverse("preferences"), {"page_size": 2})
+        self.assertEqual([row["movie_id"] for row in response.json()["results"]], ["3", "2"])
+        response = self.client.get(reverse("preferences"), {"cursor": response.json()["next"]})
+        self.assertEqual([row["movie_id"] for row in response.json()["results"]], ["1"])
+        self.assertEqual(
+            self.client.get(reverse("preference_ids")).json(), {"liked": ["3", "1"], "disliked": ["2"]}
+        )
+
+    def test_one_movie(self):
+        response = self.client.get(reverse("preference", args=["2"]))
+        self.assertEqual((response.json()["movie_id"], response.json()["disliked"]), ("2", True))
+        self.assertEqual(self.client.get(reverse("preference", args=["4"])).status_code, 404)
+
+        self.assertEqual(self.client.delete(reverse("preference", args=["2"])).status_code, 200)
+        self.assertEqual(self.client.delete(reverse("preference", args=["2"])).status_code, 404)
+        self.assertEqual(self.client.get(reverse("preference", args=["2"])).status_code, 404)
+
+    def test_clear_all(self):
+        response = self.client.delete(reverse("preferences"))
+        self.assertEqual(response.json()["deleted"], 3)
+        self.assertFalse(UserPreference.objects.filter(user=self.user).exists())
+        self.assertTrue(UserPreference.objects.filter(movie_id="4").exists())
+        self.assertEqual(
+            sorted(InteractionEvent.objects.filter(user=self.user, source="userpreference")
+                   .values_list("movie_id", flat=True)),
+            ["1", "1", "2", "2", "3", "3"],
+        )
+
+
+class BulkLibraryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("alice")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        upsert_library_row(Watchlist, self.user.id, "1")
+        upsert_library_row(Watchlist, self.user.id, "2")
+
+    def post(self, body, name="bulk-watchlist"):
+        return self.client.post(reverse(name), body, format="json")
+
+    def test_result_per_item(self):
+        response = self.post({"items": [
+            {"movie_id": "1", "status": "watching"},
+            {"movie_id": "3"},
+            {"movie_id": "2", "op": "remove"},
+            {"movie_id": "4", "op": "remove"},
+            {"movie_id": "5", "status": "bogus"},
+            {"movie_id": "6", "op": "toggle"},
+            {"op": "add"},
+            {"movie_id": "3", "op": "remove"},
+            "7",
+        ]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(result["movie_id"], result["result"]) for result in response.json()["results"]],
+            [
+                ("1", "updated"), ("3", "created"), ("2", "removed"), ("4", "not_found"),
+                ("5", "error"), ("6", "error"), (None, "error"), ("3", "error"), (None, "error"),
+            ],
+        )
+        self.assertEqual(
+            dict(Watchlist.objects.filter(user=self.user).values_list("movie_id", "status")),
+            {"1": "watching", "3": "to_watch"},
+        )
+
+    def test_preferences_are_mutually_exclusive(self):
+        self.post({"items": [{"movie_id": "1", "liked": True, "disliked": True}]}, "bulk_preferences")
+        preference = UserPreference.objects.get(user=self.user, movie_id="1")
+        self.assertEqual((preference.liked, preference.disliked), (True, False))
+
+    def test_query_count_does_not_depend_on_the_batch_size(self):
+        def batch(size, start):
+            # Half adds (new and existing rows), half removes (existing and missing rows).
+            return {"items": [
+                {"movie_id": str(movie_id), "op": "remove" if i % 2 else "add"}
+                for i, movie_id in enumerate(range(start, start + size))
+            ]}
+
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self.post(batch(2, 100)).status_code, 200)
+        with self.assertNumQueries(len(small)):
+            response = self.post(batch(50, 1))
+        self.assertEqual(
+            [result["result"] for result in response.json()["results"]][:4],
+            ["updated", "removed", "created", "not_found"],
+        )
+
+    @override_settings(LIBRARY_MAX_BULK_ITEMS=2)
+    def test_item_cap(self):
+        self.assertEqual(self.post({"items": [{"movie_id": "8"}, {"movie_id": "9"}]}).status_code, 200)
+        response = self.post({"items": [{"movie_id": str(i)} for i in range(3)]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("items", response.json())
+
+    def test_malformed_bodies_are_rejected(self):
+        for body in ([1, 2], "items", {"items": []}, {"items": {"movie_id": "1"}}, {}):
+            with self.subTest(body=body):
+                self.assertEqual(self.post(body).status_code, 400)
+
+
+class FakeRedis:
+    """
+    In-memory stand-in for the parts of redis.Redis that RedisBackend uses.
+    """
+
+    def __init__(self):
+        self.data = {}  # key -> (value, ex)
+
+    def get(self, key):
+        return self.data.get(key, (None, None))[0]
+
+    def set(self, key, value, ex=None):
+        self.data[key] = (value, ex)
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+class TMDbCacheTests(SimpleTestCase):
+    TTLS = {"popular": 300, "movie": 86400, "default": 3600}
+
+    def setUp(self):
+        self.calls = 0
+
+    def fetch(self, **body):
+        def fetch():
+            self.calls += 1
+            return body
+        return fetch
+
+    def test_locmem_evicts_least_recently_used_by_size(self):
+        backend = LocMemBackend(max_bytes=10)
+        backend.set("a", b"aaaa", 60)
+        backend.set("b", b"bbbb", 60)
+        backend.get("a")
+        backend.set("c", b"cccc", 60)
+        self.assertEqual([backend.get(key) for key in "abc"], [b"aaaa", None, b"cccc"])
+        backend.set("huge", b"x" * 11, 60)
+        self.assertIsNone(backend.get("huge"))
+        self.assertEqual(backend.get("a"), b"aaaa")
+
+    def test_locmem_expires_entries(self):
+        backend = LocMemBackend()
+        with mock.patch("core.cache.time.monotonic", return_value=1000):
+            backend.set("a", b"value", 60)
+        with mock.patch("core.cache.time.monotonic", return_value=1059):
+            self.assertEqual(backend.get("a"), b"value")
+        with mock.patch("core.cache.time.monotonic", return_value=1060):
+            self.assertIsNone(backend.get("a"))
+        self.assertEqual(backend._size, 0)
+
+    def test_redis_backend(self):
+        client = FakeRedis()
+        tmdb_cache = TMDbCache(RedisBackend(client), self.TTLS)
+        for _ in range(2):
+            self.assertEqual(tmdb_cache.get_or_fetch("/movie/5", {"language": "en"}, self.fetch(id=5)), {"id": 5})
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(client.data, {"tmdb:/movie/5?language=en": (b'{"id": 5}', 86400)})
+        RedisBackend(client).delete("/movie/5?language=en")
+        self.assertEqual(client.data, {})
+
+    def test_ttl_per_endpoint(self):
+        tmdb_cache = TMDbCache(LocMemBackend(), self.TTLS)
+        for path, ttl in (
+            ("/movie/popular", 300), ("/movie/top_rated", 300), ("/movie/5", 86400),
+            ("/movie/5/credits", 86400), ("/search/movie", 3600),
+        ):
+            with self.subTest(path=path):
+                self.assertEqual(tmdb_cache.ttl_for(path), ttl)
+
+        uncached = TMDbCache(LocMemBackend(), {"movie": 0})
+        uncached.get_or_fetch("/movie/5", {}, self.fetch(id=5))
+        uncached.get_or_fetch("/movie/5", {}, self.fetch(id=5))
+        self.assertEqual(self.calls, 2)
+
+    def test_key_ignores_api_key_and_param_order(self):
+        tmdb_cache = TMDbCache(LocMemBackend(), self.TTLS)
+        tmdb_cache.get_or_fetch("/movie/popular", {"api_key": "a", "page": 1, "language": "en"}, self.fetch(page=1))
+        tmdb_cache.get_or_fetch("/movie/popular", {"language": "en", "page": 1, "api_key": "b"}, self.fetch(page=1))
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(TMDbCache.make_key("/movie/popular", {"page": 1, "api_key": "a"}), "/movie/popular?page=1")
+
+    def test_errors_are_not_cached(self):
+        tmdb_cache = TMDbCache(LocMemBackend(), self.TTLS)
+
+        def fail():
+            self.calls += 1
+            raise requests.exceptions.HTTPError("503")
+
+        with self.assertRaises(requests.exceptions.HTTPError):
+            tmdb_cache.get_or_fetch("/movie/5", {}, fail)
+        self.assertEqual(tmdb_cache.get_or_fetch("/movie/5", {}, self.fetch(id=5)), {"id": 5})
+        self.assertEqual(self.calls, 2)
+
+    def test_misconfigured_backend(self):
+        with mock.patch.dict("sys.modules", {"redis": None}):
+            with self.assertRaisesMessage(ImproperlyConfigured, "redis package"):
+                build_cache({"BACKEND": "redis", "REDIS_URL": "redis://localhost"})
+            with override_settings(TMDB_CACHE={"BACKEND": "redis", "REDIS_URL": "redis://localhost"}):
+                self.assertEqual([error.id for error in check_tmdb_cache_backend(None)], ["core.E001"])
+        with self.assertRaises(ImproperlyConfigured):
+            build_cache({"BACKEND": "memcached"})
+        self.assertEqual(check_tmdb_cache_backend(None), [])
+
+
+class FanOutTests(SimpleTestCase):
+    def setUp(self):
+        self.active = self.peak = 0
+        self.lock = threading.Lock()
+
+    def work(self, item):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(0.02 if item % 2 else 0.005)  # finish out of order
+            if item in (4, 12):
+                raise ValueError(item)
+            return item * 10
+        finally:
+            with self.lock:
+                self.active -= 1
+
+    @override_settings(TMDB_MAX_WORKERS=3)
+    def test_bounded_and_ordered(self):
+        items = [item for item in range(20) if item not in (4, 12)]
+        self.assertEqual(tmdb.fan_out(self.work, items), [item * 10 for item in items])
+        self.assertEqual(self.peak, 3)
+        self.assertEqual(tmdb.fan_out(self.work, []), [])
+
+    def test_first_error_is_raised(self):
+        results = tmdb.iter_fan_out(self.work, range(20), max_workers=5)
+        self.assertEqual([next(results) for _ in range(4)], [0, 10, 20, 30])
+        with self.assertRaises(ValueError) as raised:
+            next(results)
+        self.assertEqual(raised.exception.args, (4,))
+
+
+class TMDbSessionTests(SimpleTestCase):
+    """
+    The threaded client against a local HTTP server, through the
+    retrying adapter of build_session().
+    """
+
+    def setUp(self):
+        self.replies = []  # (status, headers) to send, then 200s
+        self.paths = []
+        test = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                test.paths.append(self.path)
+                status, headers = test.replies.pop(0) if test.replies else (200, {})
+                body = json.dumps({"status": status}).encode()
+                self.send_response(status)
+                for name, value in {**headers, "Content-Length": str(len(body))}.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        base_url = f"http://127.0.0.1:{server.server_port}/3"
+        for patcher in (
+            mock.patch.object(tmdb, "TMDB_BASE_URL", base_url),
+            mock.patch.object(tmdb, "_rate_limiter", tmdb.RateLimiter(rate=1000, burst=1000)),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def use_session(self):
+        session = tmdb.build_session()
+        session.mount("http://", session.get_adapter("https://api.themoviedb.org"))
+        patcher = mock.patch.object(tmdb, "_session", session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(TMDB_RETRIES=3, TMDB_RETRY_BACKOFF=0, TMDB_RETRY_AFTER_MAX=2)
+    def test_retries_honour_a_capped_retry_after(self):
+        self.use_session()
+        self.replies = [(429, {"Retry-After": "120"}), (503, {})]
+        with mock.patch("urllib3.util.retry.time.sleep") as sleep:
+            self.assertEqual(tmdb._request("/movie/5", {}), {"status": 200})
+        self.assertEqual(len(self.paths), 3)
+        sleep.assert_called_once_with(2)
+
+    @override_settings(TMDB_RETRIES=2, TMDB_RETRY_BACKOFF=0)
+    def test_raises_once_retries_run_out(self):
+        self.use_session()
+        self.replies = [(500, {})] * 5
+        with self.assertRaises(requests.exceptions.HTTPError) as raised:
+            tmdb._request("/movie/5", {})
+        self.assertEqual(raised.exception.response.status_code, 500)
+        self.assertEqual(len(self.paths), 3)
+
+    @override_settings(TMDB_RETRIES=3)
+    def test_client_errors_are_not_retried(self):
+        self.use_session()
+        self.replies = [(404, {})]
+        with self.assertRaises(requests.exceptions.HTTPError):
+            tmdb._request("/movie/5", {})
+        self.assertEqual(len(self.paths), 1)
+
+    @override_settings(TMDB_RETRY_AFTER_MAX=2)
+    def test_retry_after_cap(self):
+        retry = tmdb.TMDbRetry()
+        for header, expected in (("120", 2), ("1", 1)):
+            with self.subTest(header=header):
+                response = urllib3.HTTPResponse(status=429, headers={"Retry-After": header})
+                self.assertEqual(retry.get_retry_after(response), expected)
+        self.assertIsNone(retry.get_retry_after(urllib3.HTTPResponse(status=429)))
+
+    def test_rate_limiter_bursts_then_keeps_the_rate_across_threads(self):
+        limiter = tmdb.RateLimiter(rate=50, burst=5)
+        start = time.monotonic()
+        for _ in range(5):
+            limiter.acquire()
+        self.assertLess(time.monotonic() - start, 0.05)
+
+        threads = [threading.Thread(target=limiter.acquire) for _ in range(10)]
+        start = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # 10 more tokens at 50 per second, the burst being spent.
+        self.assertGreaterEqual(time.monotonic() - start, 0.19)
+        self.assertLess(time.monotonic() - start, 1)
+
+
+class TMDbAsyncClientTests(SimpleTestCase):
+    def setUp(self):
+        self.requests = []
+        self.active = self.peak = 0
+        self.failures = {}  # path -> status codes to answer before succeeding
+        mock_tmdb(self, self.handle)
+
+    async def handle(self, request):
+        self.requests.append(request.url.path)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(0.01)
+            failures = self.failures.get(request.url.path)
+            if failures:
+                return httpx.Response(failures.pop(0))
+            movie_id = int(request.url.path.rsplit("/", 1)[-1])
+            return httpx.Response(200, json={"id": movie_id, "title": f"Movie {movie_id}"})
+        finally:
+            self.active -= 1
+
+    def test_client_is_closed_with_its_loop(self):
+        clients = []
+
+        async def fetch(movie_id):
+            clients.append(tmdb_async.get_client())
+            return await tmdb_async.fetch_movie_details(movie_id)
+
+        self.assertEqual(async_to_sync(fetch)(1)["id"], 1)
+        self.assertEqual(async_to_sync(fetch)(2)["id"], 2)
+        self.assertEqual(len(clients), 2)
+        self.assertTrue(all(client.is_closed for client in clients))
+        self.assertEqual(len(tmdb_async._clients), 0)
+
+    @override_settings(TMDB_MAX_WORKERS=3)
+    def test_fan_out_is_bounded_and_ordered(self):
+        async def fetch_all():
+            movies = [{"id": movie_id} for movie_id in range(100, 120)]
+            return [movie["id"] async for movie in tmdb_async.iter_movies_details(movies)]
+
+        self.assertEqual(asyncio.run(fetch_all()), list(range(100, 120)))
+        self.assertEqual(self.peak, 3)
+
+    @override_settings(TMDB_RETRY_BACKOFF=0)
+    def test_retries_take_one_rate_limit_token(self):
+        self.failures["/3/movie/7"] = [503, 429]
+        limiter = mock.Mock(acquire_async=mock.AsyncMock())
+        with mock.patch.object(tmdb_async, "get_rate_limiter", return_value=limiter):
+            movie = asyncio.run(tmdb_async.fetch_movie_details(7))
+        self.assertEqual(movie["id"], 7)
+        self.assertEqual(self.requests.count("/3/movie/7"), 3)
+        limiter.acquire_async.assert_awaited_once()
+
+
+class FastSerializationTests(TestCase):
+    def test_values_serializer_matches_model_serializer(self):
+        user = User.objects.create_user("alice")
+        upsert_library_row(Watchlist, user.id, "1", status="watching")
+        upsert_library_row(Favorite, user.id, "1")
+        upsert_library_row(WatchedHistory, user.id, "1")
+        upsert_library_row(UserPreference, user.id, "1", liked=True)
+        upsert_library_row(UserPreference, user.id, "2", disliked=True)
+        Recommendation.objects.create(user=user, movie_id="3", score=0.1 + 0.2)
+        Recommendation.objects.create(user=user, movie_id="4", score=1e-7)
+        for serializer_class in (
+            WatchlistSerializer, FavoriteSerializer, WatchedHistorySerializer,
+            UserPreferenceSerializer, RecommendationSerializer,
+        ):
+            with self.subTest(serializer=serializer_class.__name__):
+                queryset = serializer_class.Meta.model.objects.filter(user=user).order_by("id")
+                expected = serializer_class(queryset, many=True).data
+                fast = values_serializer(serializer_class)
+                actual = fast.data(list(fast.rows(queryset)))
+                self.assertEqual([list(row) for row in actual], [list(row) for row in expected])
+                self.assertEqual(actual, [dict(row) for row in expected])
+
+    def test_renderer_matches_json_renderer(self):
+        data = {
+            "text": "caf\u00e9 \u2028 \"quoted\"",
+            "numbers": [0, -1, 2 ** 40, 0.5, 1e-7, 1e16],
+            "nested": {"none": None, "flag": True},
+        }
+        self.assertEqual(json.loads(ORJSONRenderer().render(data)), json.loads(JSONRenderer().render(data)))
+        self.assertIn(b"\\u2028", ORJSONRenderer().render(data))
+
+    def test_renderer_non_finite_floats(self):
+        self.assertEqual(ORJSONRenderer().render({"score": math.nan}), b'{"score":null}')
+        with self.assertRaises(ValueError):
+            JSONRenderer().render({"score": math.nan})
+
+
+class LibraryListCacheTests(TestCase):
+    def setUp(self):
+        shared_cache(self)
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user("alice")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        upsert_library_row(Watchlist, self.user.id, "1")
+        Movie.objects.create(movie_id="1", title="Old title", genres=[], cast=[], fetched_at=timezone.now())
+
+    def get(self, etag=None, **params):
+        headers = {"HTTP_IF_NONE_MATCH": etag} if etag else {}
+        return self.client.get(reverse("get-watchlist"), params, **headers)
+
+    def test_unchanged_library_revalidates_without_queries(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Cache-Control"], "private, no-cache")
+        with self.assertNumQueries(0):
+            response = self.get(response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_write_changes_the_etag(self):
+        etag = self.get()["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            upsert_library_row(Watchlist, self.user.id, "2")
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual([row["movie_id"] for row in response.json()["results"]], ["2", "1"])
+
+    def test_query_string_is_part_of_the_etag(self):
+        etag = self.get()["ETag"]
+        self.assertEqual(self.get(etag, status="watching").status_code, 200)
+
+    def test_expanded_movies_follow_metadata_changes(self):
+        response = self.get(expand="movie")
+        self.assertEqual(response.json()["results"][0]["movie"]["title"], "Old title")
+        self.assertEqual(self.get(response["ETag"], expand="movie").status_code, 304)
+
+        Movie.objects.filter(movie_id="1").update(title="New title")
+        refreshed = self.get(response["ETag"], expand="movie")
+        self.assertEqual(refreshed.status_code, 200)
+        self.assertEqual(refreshed.json()["results"][0]["movie"]["title"], "New title")
+
+    def test_process_local_cache_sends_no_etag(self):
+        with override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}):
+            response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header("ETag"))
+
+
+class SimilarMoviesTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings_override = override_settings(SIMILARITY_INDEX_DIR=tmp.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        stale = timezone.now() - timedelta(days=365)
+        for movie_id, genres, cast, year in (
+            ("1", ["Action", "Sci-Fi"], [10, 11], 2010),
+            ("2", ["Action", "Sci-Fi"], [10, 12], 2011),
+            ("3", ["Action"], [13], 2000),
+            ("4", ["Romance"], [14], 1990),
+        ):
+            Movie.objects.create(
+                movie_id=movie_id, title=f"Movie {movie_id}", genres=genres, cast=cast,
+                rating=7.0, release_date=date(year, 1, 1), fetched_at=stale,
+            )
+        self.assertEqual(build_index(k=3), 4)
+
+    def test_served_from_the_index_without_refreshing(self):
+        with mock.patch("core.metadata.refresh_in_background") as refresh:
+            response = self.client.get(reverse("similar-movies", args=[1]), {"limit": 2})
+        refresh.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([movie["id"] for movie in response.json()], [2, 3])
+        scores = [movie["score"] for movie in response.json()]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_unknown_movie_and_bad_limit(self):
+        self.assertEqual(self.client.get(reverse("similar-movies", args=[99])).status_code, 404)
+        self.assertEqual(self.client.get(reverse("similar-movies", args=[1]), {"limit": "x"}).status_code, 400)
+
+
+class MovieMetadataRefreshTests(TestCase):
+    def setUp(self):
+        self.title = "First title"
+        self.upstream_calls = 0
+        mock_tmdb(self, self.handle)
+
+    def handle(self, request):
+        self.upstream_calls += 1
+        return httpx.Response(200, json={"id": int(request.url.path.rsplit("/", 1)[-1]), "title": self.title})
+
+    def test_refresh_bypasses_the_response_cache(self):
+        fetch_movies(["5"])
+        self.title = "Second title"
+        fetch_movies(["5"])
+        self.assertEqual((self.upstream_calls, Movie.objects.get(movie_id="5").title), (1, "First title"))
+
+        call_command("refresh_movie_metadata", "--all", stdout=StringIO())
+        self.assertEqual((self.upstream_calls, Movie.objects.get(movie_id="5").title), (2, "Second title"))
+        # The refreshed response replaced the cached one.
+        self.assertEqual(tmdb.fetch_movie_details(5)["title"], "Second title")
+        self.assertEqual(self.upstream_calls, 2)
+
+
+class CoalescerTests(SimpleTestCase):
+    def test_concurrent_threads_share_one_call(self):
+        coalescer = Coalescer(f"test-{uuid.uuid4().hex}")  # fresh counters
+        calls = []
+        release = threading.Event()
+
+        def fetch():
+            calls.append(1)
+            release.wait(5)
+            return "result"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(coalescer.do("key", fetch))) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        # Let every thread reach the coalescer before the call finishes.
+        while coalescer.stats()["leaders"] + coalescer.stats()["followers"] < len(threads):
+            threading.Event().wait(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual((len(calls), results), (1, ["result"] * 20))
+        self.assertEqual(coalescer.stats()["in_flight"], 0)
+
+    def test_concurrent_coroutines_share_one_call(self):
+        coalescer = Coalescer("test-coroutines")
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "result"
+
+        async def main():
+            return await asyncio.gather(*(coalescer.ado("key", fetch) for _ in range(20)))
+
+        self.assertEqual(asyncio.run(main()), ["result"] * 20)
+        self.assertEqual(len(calls), 1)
+
+    def test_errors_reach_every_caller(self):
+        coalescer = Coalescer("test-errors")
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            raise ValueError("upstream failed")
+
+        async def main():
+            return await asyncio.gather(*(coalescer.ado("key", fetch) for _ in range(5)), return_exceptions=True)
+
+        self.assertTrue(all(isinstance(result, ValueError) for result in asyncio.run(main())))
+
+    def test_stats_while_loops_come_and_go(self):
+        coalescer = Coalescer("test-stats")
+        stop = threading.Event()
+        errors = []
+
+        def read_stats():
+            while not stop.is_set():
+                try:
+                    coalescer.stats()
+                except RuntimeError as e:
+                    errors.append(e)
+
+        async def fetch():
+            return 1
+
+        reader = threading.Thread(target=read_stats)
+        reader.start()
+        try:
+            for i in range(200):
+                asyncio.run(coalescer.ado(i, fetch))
+        finally:
+            stop.set()
+            reader.join()
+        self.assertEqual(errors, [])
+
+
+class MovieDetailsTests(TestCase):
+    DETAILS = {
+        "id": 7,
+        "title": "Seven",
+        "release_date": "1995-09-22",
+        "vote_average": 8.4,
+        "runtime": 127,
+        "genres": [{"id": 80, "name": "Crime"}, {"id": 9648, "name": "Mystery"}],
+        "overview": "Two detectives.",
+        "poster_path": "/poster.jpg",
+        "backdrop_path": None,
+        "credits": {"cast": [
+            {"id": i, "name": f"Actor {i}", "character": f"Role {i}", "profile_path": f"/{i}.jpg"}
+            for i in range(1, 8)
+        ]},
+        "videos": {"results": [
+            {"site": "Vimeo", "type": "Trailer", "key": "vimeo"},
+            {"site": "YouTube", "type": "Teaser", "key": "teaser"},
+            {"site": "YouTube", "type": "Trailer", "key": "first"},
+            {"site": "YouTube", "type": "Trailer", "key": "second"},
+        ]},
+    }
+
+    def setUp(self):
+        self.requests = []
+        mock_tmdb(self, self.handle)
+
+    def handle(self, request):
+        self.requests.append((request.url.path, request.url.params.get("append_to_response")))
+        return httpx.Response(200, json=self.DETAILS)
+
+    def test_format_movie(self):
+        details = json.loads(json.dumps(self.DETAILS))
+        del details["credits"]["cast"][1]["profile_path"]
+        movie = tmdb.format_movie(details)
+        self.assertEqual(movie["trailer"], "https://www.youtube.com/embed/first")
+        self.assertEqual([actor["id"] for actor in movie["cast"]], [1, 2, 3, 4, 5])
+        self.assertEqual(movie["cast"][0], {
+            "id": 1, "name": "Actor 1", "character": "Role 1", "image": "https://image.tmdb.org/t/p/w200/1.jpg",
+        })
+        self.assertIsNone(movie["cast"][1]["image"])
+        self.assertEqual(movie["genres"], ["Crime", "Mystery"])
+        self.assertEqual(movie["poster"], "https://image.tmdb.org/t/p/w500/poster.jpg")
+        self.assertIsNone(movie["backdrop"])
+        self.assertEqual((movie["releaseDate"], movie["rating"], movie["runtime"]), ("1995-09-22", 8.4, 127))
+
+    def test_no_cast_or_trailer(self):
+        movie = tmdb.format_movie({"id": 7, "title": "Seven", "videos": {"results": [
+            {"site": "YouTube", "type": "Clip", "key": "clip"},
+        ]}})
+        self.assertEqual((movie["trailer"], movie["cast"]), (None, []))
+
+    def test_detailed_movie_in_one_call(self):
+        response = self.client.get(reverse("search-movies", args=[7]), {"detailed": "true"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), tmdb.format_movie(self.DETAILS))
+        self.assertEqual(self.requests, [("/3/movie/7", "credits,videos")])
+        self.assertEqual(Movie.objects.get(movie_id="7").title, "Seven")
+
+        self.assertEqual(self.client.get(reverse("search-movies", args=[7])).json()["title"], "Seven")
+
+
+class PopularSnapshotTests(TestCase):
+    def setUp(self):
+        self.requests = []
+        self.failing = False
+        self.title = "Movie"
+        mock_tmdb(self, self.handle)
+
+    def handle(self, request):
+        self.requests.append(request.url.path)
+        if self.failing:
+            return httpx.Response(503)
+        if request.url.path == "/3/movie/popular":
+            page = int(request.url.params["page"])
+            return httpx.Response(200, json={"results": [{"id": page * 100 + i} for i in range(20)]})
+        movie_id = int(request.url.path.rsplit("/", 1)[-1])
+        return httpx.Response(200, json={"id": movie_id, "title": f"{self.title} {movie_id}"})
+
+    def get(self, **headers):
+        return self.client.get(reverse("popular-movies"), **headers)
+
+    def refresh(self):
+        call_command("refresh_popular_snapshot", stdout=StringIO())
+
+    def test_first_request_builds_the_snapshot(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([movie["id"] for movie in response.json()][:3], [100, 101, 102])
+        self.assertEqual(len(response.json()), POPULAR_SNAPSHOT_SIZE)
+        self.assertEqual(response["ETag"], f'"{Snapshot.objects.get(name=POPULAR_SNAPSHOT).etag}"')
+        self.assertTrue(response.has_header("Last-Modified"))
+
+        self.requests.clear()
+        self.assertEqual(self.get()["ETag"], response["ETag"])
+        self.assertEqual(self.requests, [])
+
+    def test_conditional_requests(self):
+        self.refresh()
+        response = self.get()
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+        self.title = "Renamed"
+        tmdb.get_tmdb_cache().backend.clear()
+        self.refresh()
+        refreshed = self.get(HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(refreshed.status_code, 200)
+        self.assertEqual(refreshed.json()[0]["title"], "Renamed 100")
+
+    def test_failed_refresh_keeps_the_last_snapshot(self):
+        self.refresh()
+        etag = self.get()["ETag"]
+        tmdb.get_tmdb_cache().backend.clear()
+        self.failing = True
+        with self.assertRaisesMessage(CommandError, "Popular snapshot refresh failed"):
+            self.refresh()
+        response = self.get()
+        self.assertEqual((response.status_code, response["ETag"]), (200, etag))
+
+    def test_interval_mode_logs_failures_and_keeps_going(self):
+        self.failing = True
+
+        def sleep(seconds):
+            if not self.failing:
+                raise KeyboardInterrupt  # stop after the successful run
+            self.failing = False
+
+        stderr = StringIO()
+        with mock.patch("core.management.commands.refresh_popular_snapshot.time.sleep", side_effect=sleep):
+            with self.assertRaises(KeyboardInterrupt):
+                call_command("refresh_popular_snapshot", "--interval", "60", stdout=StringIO(), stderr=stderr)
+        self.assertIn("Popular snapshot refresh failed", stderr.getvalue())
+        self.assertTrue(Snapshot.objects.filter(name=POPULAR_SNAPSHOT).exists())
+
+
+class PopularMoviesViewTests(TestCase):
+    def setUp(self):
+        self.requests = []
+        self.released = threading.Event()  # while cleared, movies other than 100 wait for it
+        self.released.set()
+        self.addCleanup(self.released.set)
+        mock_tmdb(self, self.handle)
+
+    def handle(self, request):
+        self.requests.append(request.url.path)
+        if request.url.path == "/3/movie/popular":
+            page = int(request.url.params["page"])
+            if page > TMDB_MAX_PAGE:
+                return httpx.Response(400)
+            results = [{"id": page * 100 + i} for i in range(20)] if page <= 3 else []
+            return httpx.Response(200, json={"page": page, "results": results, "total_results": 60})
+        movie_id = int(request.url.path.rsplit("/", 1)[-1])
+        if movie_id != 100:
+            self.released.wait(5)
+        return httpx.Response(200, json={"id": movie_id, "title": f"Movie {movie_id}"})
+
+    def get(self, **params):
+        return self.client.get(reverse("popular-movies"), params)
+
+    def test_default_page_size_is_fifty(self):
+        response = self.get(page=1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()["page_size"], len(response.json()["results"])), (50, 50))
+
+    def test_stream_under_wsgi_sends_each_movie_when_ready(self):
+        self.released.clear()
+        response = self.get(stream="true", page_size=20)
+        self.assertFalse(response.is_async)
+        lines = iter(response.streaming_content)
+        # Every other movie is still waiting on TMDb.
+        self.assertTrue(next(lines).startswith(b'{"id":100,"title":"Movie 100","releaseDate":null,'))
+        self.released.set()
+        self.assertEqual([json.loads(line)["id"] for line in lines], list(range(101, 120)))
+
+    def test_stream_under_asgi(self):
+        async def read():
+            response = await AsyncClient().get(reverse("popular-movies"), {"stream": "true", "page_size": 3})
+            self.assertTrue(response.is_async)
+            return [line async for line in response.streaming_content]
+
+        lines = async_to_sync(read)()
+        self.assertTrue(lines[0].startswith(b'{"id":100,"title":"Movie 100","releaseDate":null,'))
+        self.assertEqual([json.loads(line)["id"] for line in lines], [100, 101, 102])
+
+    def test_slice(self):
+        response = self.get(page=2, page_size=15)
+        self.assertEqual([movie["id"] for movie in response.json()["results"]], [*range(115, 120), *range(200, 210)])
+        self.assertEqual(response.json()["total_results"], 60)
+
+    def test_pages_past_the_end(self):
+        self.assertEqual(self.get(page=10, page_size=50).json()["results"], [])
+        self.requests.clear()
+        response = self.get(page=TMDB_MAX_PAGE, page_size=50)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.requests, [])
+        for params in ({"page": 0}, {"page": "x"}, {"page": 1, "page_size": 51}):
+            with self.subTest(params=params):
+                self.assertEqual(self.get(**params).status_code, 400)
+
+    def test_popular_pages_stop_at_the_last_tmdb_page(self):
+        self.assertEqual(list(popular_pages(0, 50)), [1, 2, 3])
+        self.assertEqual(list(popular_pages(9990, 50)), [TMDB_MAX_PAGE])
+
+
+class DatabaseSettingsTests(SimpleTestCase):
+    def load(self, **env):
+        """
+        The settings module's DATABASES and DATABASE_REPLICAS as parsed
+        from the given DB_* environment variables.
+        """
+        with mock.patch.dict(os.environ, env):
+            for name in [name for name in os.environ if name.startswith("DB_") and name not in env]:
+                del os.environ[name]
+            parsed = runpy.run_path(str(Path(settings.BASE_DIR, "filmhub", "settings.py")))
+        return parsed["DATABASES"], parsed["DATABASE_REPLICAS"]
+
+    def test_persistent_connections_by_default(self):
+        databases, replicas = self.load()
+        self.assertEqual(databases["default"]["CONN_MAX_AGE"], 60)
+        self.assertIs(databases["default"]["CONN_HEALTH_CHECKS"], True)
+        self.assertIs(databases["default"]["DISABLE_SERVER_SIDE_CURSORS"], False)
+        self.assertEqual(databases["default"]["OPTIONS"], {})
+        self.assertEqual((list(databases), replicas), (["default"], []))
+
+    def test_pool(self):
+        databases, _ = self.load(
+            DB_POOL="true", DB_POOL_MIN_SIZE="4", DB_POOL_MAX_SIZE="8", DB_POOL_TIMEOUT="2.5",
+            DB_CONN_MAX_AGE="600", DB_PGBOUNCER="yes",
+        )
+        self.assertEqual(databases["default"]["OPTIONS"]["pool"], {"min_size": 4, "max_size": 8, "timeout": 2.5})
+        # Django refuses persistent connections together with a pool.
+        self.assertEqual(databases["default"]["CONN_MAX_AGE"], 0)
+        self.assertIs(databases["default"]["DISABLE_SERVER_SIDE_CURSORS"], True)
+
+    def test_replicas(self):
+        databases, replicas = self.load(DB_REPLICA_HOSTS="db-r1, db-r2", DB_POOL="true", DB_NAME="films")
+        self.assertEqual(replicas, ["replica_0", "replica_1"])
+        for alias, host in zip(replicas, ("db-r1", "db-r2")):
+            replica = databases[alias]
+            self.assertEqual((replica["HOST"], replica["NAME"]), (host, "films"))
+            self.assertEqual(replica["TEST"], {"MIRROR": "default"})
+            self.assertEqual(replica["OPTIONS"], databases["default"]["OPTIONS"])
+            self.assertIsNot(replica["OPTIONS"], databases["default"]["OPTIONS"])
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaRouterTests(TransactionTestCase):
+    """
+    Routing against a "replica" alias declared as a test mirror of the
+    primary, so it reads the same database without real replication.
+    TransactionTestCase because the router keeps reads made inside a
+    transaction on the primary. The alias only exists once setUpClass()
+    has declared it, hence "__all__" rather than naming it.
+    """
+    databases = "__all__"
+
+    @classmethod
+    def setUpClass(cls):
+        primary = connections[DEFAULT_DB_ALIAS].settings_dict
+        connections.settings["replica"] = {**primary, "TEST": {**primary["TEST"], "MIRROR": DEFAULT_DB_ALIAS}}
+        cls.addClassCleanup(cls.remove_replica)
+        super().setUpClass()
+
+    @classmethod
+    def remove_replica(cls):
+        connections["replica"].close()
+        del connections["replica"]
+        del connections.settings["replica"]
+
+    def setUp(self):
+        shared_cache(self)
+        self.user = User.objects.create_user("alice")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_reads_inside_replica_reads_use_the_replica(self):
+        upsert_library_row(Watchlist, self.user.id, "1")
+        cache.clear()  # drop the sticky window opened by the write
+        self.assertEqual(Watchlist.objects.all().db, DEFAULT_DB_ALIAS)
+        with replica_reads(self.user.id):
+            rows = Watchlist.objects.filter(user=self.user)
+            self.assertEqual(rows.db, "replica")
+            self.assertEqual([row.movie_id for row in rows], ["1"])
+            self.assertEqual(router.db_for_write(Watchlist), DEFAULT_DB_ALIAS)
+            with transaction.atomic():
+                self.assertEqual(Watchlist.objects.all().db, DEFAULT_DB_ALIAS)
+
+    def test_reads_stick_to_the_primary_after_a_write(self):
+        self.client.post(reverse("add-watchlist"), {"movie_id": "1"}, format="json")
+        with CaptureQueriesContext(connections["replica"]) as replica_queries:
+            response = self.client.get(reverse("get-watchlist"))
+        self.assertEqual([item["movie_id"] for item in response.json()["results"]], ["1"])
+        self.assertEqual(len(replica_queries), 0)
+
+        cache.clear()  # the sticky window expired
+        with CaptureQueriesContext(connections["replica"]) as replica_queries:
+            response = self.client.get(reverse("get-watchlist"))
+        self.assertEqual([item["movie_id"] for item in response.json()["results"]], ["1"])
+        self.assertGreater(len(replica_queries), 0)
+
+    def test_process_local_cache_keeps_reads_on_the_primary(self):
+        settings_override = override_settings(CACHES={
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        })
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        stick_to_primary(self.user.id)
+        self.assertIsNone(cache.get(f"db:sticky:{self.user.id}"))
+        with replica_reads(self.user.id):
+            self.assertEqual(Watchlist.objects.all().db, DEFAULT_DB_ALIAS)
+
+    def test_migrations_only_run_on_the_primary(self):
+        self.assertIs(router.allow_migrate("replica", "core"), False)
+        self.assertIs(router.allow_migrate(DEFAULT_DB_ALIAS, "core"), True)
@@ -0,0 +1,288 @@
+"""
+Helpers for talking to the TMDb API.
+
+The views in core/views.py use these functions instead of building
+TMDb URLs and calling requests themselves. All traffic goes through one
+pooled Session with timeouts, retries and a client-side rate limit.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .cache import get_tmdb_cache
+
+TMDB_BASE_URL = "https://api.themoviedb.org/3"
+TMDB_PAGE_SIZE = 20  # results per page of TMDb list endpoints
+TMDB_MAX_PAGE = 500  # TMDb rejects list pages beyond this one
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket: allows `rate` calls per second on average
+    with bursts of up to `burst` calls. Threads and coroutines can share
+    one bucket.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self):
+        """
+        Take a token and return 0, or return the seconds until one is available.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        """
+        Block until a token is available, then take it.
+        """
+        wait = self._take()
+        while wait:
+            time.sleep(wait)
+            wait = self._take()
+
+    async def acquire_async(self):
+        """
+        Same as acquire() without blocking the event loop.
+        """
+        wait = self._take()
+        while wait:
+            await asyncio.sleep(wait)
+            wait = self._take()
+
+
+class TMDbRetry(Retry):
+    """
+    Retry policy that honours Retry-After but never sleeps longer than
+    TMDB_RETRY_AFTER_MAX seconds, so a throttled call cannot hang a worker.
+    """
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, settings.TMDB_RETRY_AFTER_MAX)
+
+
+def build_session():
+    """
+    Create a requests Session with a connection pool sized by
+    TMDB_POOL_SIZE and retries with backoff on 429/5xx responses.
+    """
+    retry = TMDbRetry(
+        total=settings.TMDB_RETRIES,
+        backoff_factor=settings.TMDB_RETRY_BACKOFF,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.TMDB_POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    return session
+
+
+_session = None
+_rate_limiter = None
+_client_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """
+    Return the process-wide TMDb rate limiter, shared by the threaded
+    and the async client.
+    """
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _client_lock:
+            if _rate_limiter is None:
+                _rate_limiter = RateLimiter(settings.TMDB_RATE_LIMIT, settings.TMDB_RATE_BURST)
+    return _rate_limiter
+
+
+def get_session():
+    """
+    Return the process-wide TMDb session and rate limiter.
+    """
+    global _session
+    rate_limiter = get_rate_limiter()
+    if _session is None:
+        with _client_lock:
+            if _session is None:
+                _session = build_session()
+    return _session, rate_limiter
+
+
+def tmdb_get(path, **params):
+    """
+    GET a TMDb endpoint and return the decoded JSON body.
+    Responses are cached per endpoint (see core.cache).
+    Raises requests.exceptions.RequestException on network errors and
+    on non-2xx responses.
+    """
+    return get_tmdb_cache().get_or_fetch(path, params, lambda: _request(path, params))
+
+
+def tmdb_refresh(path, **params):
+    """
+    Same as tmdb_get but always asks TMDb, then updates the cache.
+    """
+    return get_tmdb_cache().refresh(path, params, lambda: _request(path, params))
+
+
+def _request(path, params):
+    session, rate_limiter = get_session()
+    rate_limiter.acquire()
+    params = {"api_key": settings.TMDB_API_KEY, **params}
+    response = session.get(
+        f"{TMDB_BASE_URL}{path}",
+        params=params,
+        timeout=(settings.TMDB_CONNECT_TIMEOUT, settings.TMDB_READ_TIMEOUT),
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def iter_fan_out(func, items, max_workers=None):
+    """
+    Call func on every item using a bounded thread pool and yield the
+    results in the same order as items, each one as soon as it (and
+    every result before it) is ready. The first exception raised by
+    func is re-raised to the caller.
+    """
+    items = list(items)
+    if not items:
+        return
+    max_workers = max_workers or settings.TMDB_MAX_WORKERS
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        yield from executor.map(func, items)
+
+
+def fan_out(func, items, max_workers=None):
+    """
+    Same as iter_fan_out but returns the results as a list.
+    """
+    return list(iter_fan_out(func, items, max_workers))
+
+
+def format_cast(credits):
+    """
+    Keep the top 5 cast members with their profile image.
+    """
+    return [
+        {
+            "id": c["id"],
+            "name": c["name"],
+            "character": c.get("character"),
+            "image": f"https://image.tmdb.org/t/p/w200{c['profile_path']}" if c.get("profile_path") else None
+        }
+        for c in credits.get("cast", [])[:5]
+    ]
+
+
+def find_trailer(videos):
+    """
+    Return the embed URL of the first YouTube trailer, or None.
+    """
+    for v in videos.get("results", []):
+        if v["site"] == "YouTube" and v["type"] == "Trailer":
+            return f"https://www.youtube.com/embed/{v['key']}"
+    return None
+
+
+def format_movie(details):
+    """
+    Build the movie payload returned by MoviesWithDetailsView from a
+    /movie/{id} response fetched with append_to_response=credits,videos.
+    """
+    return {
+        "id": details["id"],
+        "title": details["title"],
+        "releaseDate": details.get("release_date"),
+        "rating": details.get("vote_average"),
+        "runtime": details.get("runtime"),
+        "genres": [g["name"] for g in details.get("genres", [])],
+        "overview": details.get("overview"),
+        "poster": f"https://image.tmdb.org/t/p/w500{details['poster_path']}" if details.get("poster_path") else None,
+        "backdrop": f"https://image.tmdb.org/t/p/original{details['backdrop_path']}" if details.get("backdrop_path") else None,
+        "trailer": find_trailer(details.get("videos", {})),
+        "cast": format_cast(details.get("credits", {}))
+    }
+
+
+def fetch_movie_details(movie_id, refresh=False):
+    """
+    Fetch details, credits and videos of one movie in a single TMDb
+    call and format them. With refresh, the response cache is bypassed.
+    """
+    get = tmdb_refresh if refresh else tmdb_get
+    details = get(f"/movie/{movie_id}", language="en-US", append_to_response="credits,videos")
+    return format_movie(details)
+
+
+def fetch_popular_movies(offset=0, limit=60):
+    """
+    Return (movies, total_results) for the TMDb popular list entries
+    [offset, offset + limit). Only the TMDb pages covering that slice
+    are fetched.
+    """
+    results = fan_out(
+        lambda page: tmdb_get("/movie/popular", language="en-US", page=page),
+        popular_pages(offset, limit),
+    )
+    return slice_popular(results, offset, limit)
+
+
+def popular_pages(offset, limit):
+    """
+    TMDb page numbers of the popular list covering [offset, offset + limit),
+    up to TMDB_MAX_PAGE.
+    """
+    return range(offset // TMDB_PAGE_SIZE + 1, min((offset + limit - 1) // TMDB_PAGE_SIZE + 1, TMDB_MAX_PAGE) + 1)
+
+
+def slice_popular(results, offset, limit):
+    """
+    Return (movies, total_results) from the popular_pages() responses.
+    """
+    movies = []
+    for data in results:
+        movies.extend(data.get("results", []))
+    start = offset % TMDB_PAGE_SIZE
+    total_results = results[0].get("total_results", 0) if results else 0
+    return movies[start:start + limit], total_results
+
+
+def iter_movies_details(movies):
+    """
+    Yield the detailed payload of each movie, in order, as soon as it
+    is ready.
+    """
+    return iter_fan_out(lambda movie: fetch_movie_details(movie["id"]), movies)
+
+
+def fetch_popular_detailed(offset=0, limit=50):
+    """
+    Fetch popular movies [offset, offset + limit) enriched with details,
+    credits and trailer, keeping TMDb's popularity order.
+    """
+    movies, _ = fetch_popular_movies(offset, limit)
+    return list(iter_movies_details(movies))
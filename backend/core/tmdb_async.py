@@ -0,0 +1,161 @@
+"""
+Async counterparts of the core.tmdb helpers, used by the async views.
+
+Calls go through httpx.AsyncClient so one worker can keep many TMDb
+requests in flight without a thread each. They share the response
+cache and the rate limiter of the threaded client and use the same
+timeouts and retry policy (429/5xx, Retry-After capped at
+TMDB_RETRY_AFTER_MAX). Fan-out is bounded by TMDB_MAX_WORKERS per call,
+as on the threaded path.
+
+An AsyncClient is bound to the event loop that created it, so there is
+one client per running loop, closed when the loop shuts down. Under
+ASGI that is one pooled client per worker; under WSGI every request
+runs in its own loop, so connections are only reused within a request.
+WSGI responses cannot stream from an async iterator without buffering
+it, so streamed responses use core.tmdb there.
+"""
+import asyncio
+import weakref
+
+import httpx
+from django.conf import settings
+
+from .cache import get_tmdb_cache
+from .tmdb import TMDB_BASE_URL, format_movie, get_rate_limiter, popular_pages, slice_popular
+
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+_clients = weakref.WeakKeyDictionary()  # event loop -> (AsyncClient, closer task)
+
+
+def build_client(**kwargs):
+    """
+    Create an AsyncClient for TMDb with the configured timeouts and
+    connection limits. kwargs are passed on (e.g. transport=).
+    """
+    return httpx.AsyncClient(
+        base_url=TMDB_BASE_URL,
+        timeout=httpx.Timeout(settings.TMDB_READ_TIMEOUT, connect=settings.TMDB_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=settings.TMDB_ASYNC_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.TMDB_POOL_SIZE,
+        ),
+        **kwargs,
+    )
+
+
+def get_client():
+    """
+    Return the TMDb AsyncClient of the running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    entry = _clients.get(loop)
+    if entry is None:
+        client = build_client()
+        entry = _clients[loop] = (client, loop.create_task(_close_on_shutdown(loop, client)))
+    return entry[0]
+
+
+async def _close_on_shutdown(loop, client):
+    """
+    Wait until the loop cancels its leftover tasks, which asyncio.run()
+    does before closing it (asgiref's per-request loops under WSGI and
+    the ASGI servers both run that way), then close the client and its
+    connection pool.
+    """
+    try:
+        await asyncio.Event().wait()
+    finally:
+        _clients.pop(loop, None)
+        await client.aclose()
+
+
+async def _bounded(semaphore, func, *args, **kwargs):
+    async with semaphore:
+        return await func(*args, **kwargs)
+
+
+async def tmdb_get(path, **params):
+    """
+    GET a TMDb endpoint and return the decoded JSON body.
+    Responses are cached per endpoint (see core.cache).
+    Raises httpx.HTTPError on network errors and on non-2xx responses.
+    """
+    return await get_tmdb_cache().aget_or_fetch(path, params, lambda: _request(path, params))
+
+
+def _retry_delay(response, attempt):
+    try:
+        return min(float(response.headers["Retry-After"]), settings.TMDB_RETRY_AFTER_MAX)
+    except (KeyError, ValueError):
+        return settings.TMDB_RETRY_BACKOFF * 2 ** attempt
+
+
+async def _request(path, params):
+    client = get_client()
+    params = {"api_key": settings.TMDB_API_KEY, **params}
+    # One token per call, retries included, as on the threaded path.
+    await get_rate_limiter().acquire_async()
+    for attempt in range(settings.TMDB_RETRIES + 1):
+        last_attempt = attempt == settings.TMDB_RETRIES
+        try:
+            response = await client.get(path, params=params)
+        except httpx.TransportError:
+            if last_attempt:
+                raise
+            await asyncio.sleep(settings.TMDB_RETRY_BACKOFF * 2 ** attempt)
+            continue
+        if response.status_code in RETRY_STATUSES and not last_attempt:
+            await asyncio.sleep(_retry_delay(response, attempt))
+            continue
+        response.raise_for_status()
+        return response.json()
+
+
+async def fetch_movie_details(movie_id):
+    """
+    Fetch details, credits and videos of one movie in a single TMDb
+    call and format them.
+    """
+    details = await tmdb_get(f"/movie/{movie_id}", language="en-US", append_to_response="credits,videos")
+    return format_movie(details)
+
+
+async def fetch_popular_movies(offset=0, limit=60):
+    """
+    Return (movies, total_results) for the TMDb popular list entries
+    [offset, offset + limit), fetching the pages concurrently.
+    """
+    semaphore = asyncio.Semaphore(settings.TMDB_MAX_WORKERS)
+    results = await asyncio.gather(*(
+        _bounded(semaphore, tmdb_get, "/movie/popular", language="en-US", page=page)
+        for page in popular_pages(offset, limit)
+    ))
+    return slice_popular(results, offset, limit)
+
+
+async def iter_movies_details(movies):
+    """
+    Yield the detailed payload of each movie, in order, as soon as it
+    is ready. Up to TMDB_MAX_WORKERS details are requested at a time;
+    the ones not consumed yet are cancelled if the caller stops early or
+    a request fails.
+    """
+    semaphore = asyncio.Semaphore(settings.TMDB_MAX_WORKERS)
+    tasks = [asyncio.ensure_future(_bounded(semaphore, fetch_movie_details, movie["id"])) for movie in movies]
+    try:
+        for task in tasks:
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def fetch_popular_detailed(offset=0, limit=50):
+    """
+    Fetch popular movies [offset, offset + limit) enriched with details,
+    credits and trailer, keeping TMDb's popularity order.
+    """
+    movies, _ = await fetch_popular_movies(offset, limit)
+    return [movie async for movie in iter_movies_details(movies)]
@@ -0,0 +1,175 @@
+"""
+Refresh token revocation checks that do not hit the database.
+
+simplejwt checks every refresh token against BlacklistedToken with a
+join query. RevocableRefreshToken answers from a per-process Bloom
+filter of the blacklisted jtis instead:
+
+- not in the filter: the token was not revoked when the filter was last
+  synced; revocations since then (made by any process) are found in the
+  shared cache, where each one is kept for a few sync intervals;
+- in the filter: revoked, or a false positive, so the database decides.
+
+The filter is topped up from BlacklistedToken every
+JWT_REVOCATION_SYNC_INTERVAL seconds and rebuilt from the unexpired
+rows every JWT_REVOCATION_REBUILD_INTERVAL seconds, or sooner when it
+fills up. Across processes this relies on a shared CACHES backend;
+with a process-local one every check goes to the database.
+Expired rows are deleted by the prune_tokens command.
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import metrics
+from .checks import cache_is_shared
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter for strings, sized for `capacity` items at
+    the given false positive rate.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little")
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        if item in self:
+            return
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+def _revoked_key(jti):
+    return f"jwt:revoked:{jti}"
+
+
+class RevocationSet:
+    """
+    Process-wide view of the blacklisted refresh token jtis (see the
+    module docstring).
+    """
+
+    def __init__(self):
+        self._bloom = None
+        self._built_at = 0
+        self._synced_at = 0
+        self._synced_until = None  # database time covered by the last sync
+        self._lock = threading.Lock()
+
+    def _build(self):
+        now = timezone.now()
+        jtis = list(
+            BlacklistedToken.objects.filter(token__expires_at__gt=now)
+            .values_list("token__jti", flat=True)
+        )
+        bloom = BloomFilter(max(settings.JWT_BLOOM_MIN_CAPACITY, 2 * len(jtis)), settings.JWT_BLOOM_ERROR_RATE)
+        for jti in jtis:
+            bloom.add(jti)
+        self._bloom = bloom
+        self._built_at = self._synced_at = time.monotonic()
+        self._synced_until = now
+        metrics.incr("jwt.revocations.rebuilds")
+
+    def _fresh(self, now):
+        return self._bloom is not None and now - self._synced_at < settings.JWT_REVOCATION_SYNC_INTERVAL
+
+    def _sync(self):
+        now = time.monotonic()
+        if self._fresh(now):
+            return
+        with self._lock:
+            if self._fresh(now):
+                return
+            if (
+                self._bloom is None
+                or self._bloom.count >= self._bloom.capacity
+                or now - self._built_at >= settings.JWT_REVOCATION_REBUILD_INTERVAL
+            ):
+                self._build()
+                return
+            # Overlap the previous sync so rows committed late are not missed.
+            since = self._synced_until - timedelta(seconds=settings.JWT_REVOCATION_SYNC_INTERVAL)
+            self._synced_until = timezone.now()
+            for jti in BlacklistedToken.objects.filter(blacklisted_at__gte=since).values_list("token__jti", flat=True):
+                self._bloom.add(jti)
+            self._synced_at = now
+
+    def add(self, jti):
+        """
+        Record a revocation made by this process.
+        """
+        cache.set(_revoked_key(jti), True, settings.JWT_REVOCATION_SYNC_INTERVAL * 3)
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(jti)
+
+    def is_revoked(self, jti):
+        started = time.perf_counter()
+        # Without a shared cache, revocations made by other workers would
+        # only be seen at the next sync, so the database always decides.
+        shared = cache_is_shared()
+        if shared:
+            self._sync()
+        if not shared or jti in self._bloom:
+            path = "database"
+            revoked = BlacklistedToken.objects.filter(token__jti=jti).exists()
+        elif cache.get(_revoked_key(jti)):
+            path, revoked = "cache", True
+        else:
+            path, revoked = "bloom", False
+        metrics.observe(f"jwt.revocation_check.{path}", time.perf_counter() - started)
+        return revoked
+
+    def stats(self):
+        bloom = self._bloom
+        return {
+            "outstanding_tokens": OutstandingToken.objects.count(),
+            "blacklisted_tokens": BlacklistedToken.objects.count(),
+            "bloom_items": bloom.count if bloom else None,
+            "bloom_capacity": bloom.capacity if bloom else None,
+        }
+
+
+revocations = RevocationSet()
+metrics.register("jwt", revocations.stats)
+
+
+class RevocableRefreshToken(RefreshToken):
+    """
+    RefreshToken whose blacklist check goes through the process-wide
+    RevocationSet.
+    """
+
+    def check_blacklist(self):
+        if revocations.is_revoked(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError("Token is blacklisted")
+
+    def blacklist(self):
+        result = super().blacklist()
+        revocations.add(self.payload[api_settings.JTI_CLAIM])
+        return result
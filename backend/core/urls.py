@@ -1,28 +1,41 @@
 from django.urls import path
-from .views import RegisterView, LoginView, LogoutView, get_movie_by_id, add_to_watchlist, get_watchlist, delete_from_watchlist, add_favorite, get_favorites, delete_favorite, set_preference, get_user_preferences, delete_user_preferences, add_WatchedHistory, get_WatchedHistory, delete_WatchedHistory, MoviesWithDetailsView
+from .views import RegisterView, LoginView, RefreshView, LogoutView, get_movie_by_id, add_to_watchlist, get_watchlist, delete_from_watchlist, add_favorite, get_favorites, delete_favorite, set_preference, user_preferences, user_preference, get_preference_ids, add_WatchedHistory, get_WatchedHistory, delete_WatchedHistory, MoviesWithDetailsView, bulk_watchlist, bulk_favorites, bulk_WatchedHistory, bulk_preferences, get_library_state, get_recommendations, get_similar_movies, get_metrics
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     path('login/', LoginView.as_view(), name='login'),
+    path('token/refresh/', RefreshView.as_view(), name='token-refresh'),
     path('logout/', LogoutView.as_view(), name='logout'),
 
     path('movies/popular/', MoviesWithDetailsView.as_view(), name='popular-movies'),
     path('movies/search/<int:movie_id>/', get_movie_by_id, name='search-movies'),
+    path('movies/<int:movie_id>/similar/', get_similar_movies, name='similar-movies'),
 
     path('watchlist/', add_to_watchlist, name='add-watchlist'),
     path('watchlist/all/', get_watchlist, name='get-watchlist'),
+    path('watchlist/bulk/', bulk_watchlist, name='bulk-watchlist'),
     path('watchlist/<str:movie_id>/', delete_from_watchlist, name='delete-watchlist'),
 
     path('favorites/', add_favorite, name='add-favorite'),
     path('favorites/all/', get_favorites, name='get-favorites'),
+    path('favorites/bulk/', bulk_favorites, name='bulk-favorites'),
     path('favorites/<str:movie_id>/', delete_favorite, name='delete-favorite'),
 
-    path('watchedhistory', add_WatchedHistory, name='add_watchedhistory'),
-    path('watchedhistory', get_WatchedHistory, name='get_watchedhistory'),
-    path('watchedhistory', delete_WatchedHistory, name='delete_watchedhistory'),
+    path('watchedhistory/', add_WatchedHistory, name='add_watchedhistory'),
+    path('watchedhistory/all/', get_WatchedHistory, name='get_watchedhistory'),
+    path('watchedhistory/bulk/', bulk_WatchedHistory, name='bulk_watchedhistory'),
+    path('watchedhistory/<str:movie_id>/', delete_WatchedHistory, name='delete_watchedhistory'),
 
     path('preference', set_preference, name='add_preference'),
-    path('preferences', get_user_preferences, name='get_preference'),
-    path('preferences', delete_user_preferences, name='delete_preferences'),
+    path('preferences/', user_preferences, name='preferences'),
+    path('preferences/ids/', get_preference_ids, name='preference_ids'),
+    path('preferences/bulk/', bulk_preferences, name='bulk_preferences'),
+    path('preferences/<str:movie_id>/', user_preference, name='preference'),
+
+    path('library/state/', get_library_state, name='library-state'),
+
+    path('recommendations/', get_recommendations, name='recommendations'),
+
+    path('metrics/', get_metrics, name='metrics'),
     
 
 ]
@@ -4,17 +4,38 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from .serializers import RegisterSerializer, LoginSerializer
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views import View
 from django.views.decorators.csrf import csrf_exempt
-from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.views import TokenObtainPairView
-from rest_framework_simplejwt.tokens import RefreshToken
-from .serializers import LoginSerializer
+from django.views.decorators.http import require_GET
+from asgiref.sync import sync_to_async
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from .serializers import LoginSerializer, RefreshSerializer
+from .tokens import RevocableRefreshToken
 from django.conf import settings
+from django.db import transaction
+import httpx
 import requests
 from rest_framework.decorators import api_view, permission_classes
 from .models import Watchlist, Favorite, WatchedHistory, UserPreference, Recommendation
-from .serializers import WatchlistSerializer, FavoriteSerializer, WatchedHistorySerializer, UserPreferenceSerializer, RecommendationSerializer
+from .serializers import WatchlistSerializer, FavoriteSerializer, WatchedHistorySerializer, UserPreferenceSerializer, RecommendationSerializer, values_serializer
+from .tmdb import TMDB_MAX_PAGE, TMDB_PAGE_SIZE, format_movie, iter_movies_details
+from . import tmdb_async
+from .renderers import ORJSONRenderer
+from . import metrics
+from .metadata import remember_movies, get_movies, movie_summary
+from .similarity import similar_movies
+from .routers import replica_reads
+from .library import (
+    upsert_library_row, remove_library_row, library_changed, parse_datetime_param, library_list_response,
+    bulk_response, watchlist_fields, preference_fields, STATE_FLAGS, library_state, preference_ids,
+    wants_movie_expansion, expand_movies,
+)
+from .snapshot import POPULAR_SNAPSHOT, POPULAR_SNAPSHOT_SIZE, get_snapshot, store_popular_snapshot
 
 class RegisterView(APIView):
     """
@@ -66,13 +87,32 @@ class LoginView(TokenObtainPairView):
     """
     serializer_class = LoginSerializer
 
+class RefreshView(TokenRefreshView):
+    """
+    API endpoint to exchange a refresh token for a new access token.
+
+    Method: POST
+    URL: /token/refresh/
+
+    Expected request data (JSON):
+    {
+        "refresh": "your_refresh_token"
+    }
+
+    Responses:
+    - 200 OK: Returns a new access token and, since refresh tokens are
+      rotated, a new refresh token (the old one is blacklisted)
+    - 401 Unauthorized: Invalid, expired or blacklisted token
+    """
+    serializer_class = RefreshSerializer
+
 class LogoutView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
         try:
             refresh_token = request.data["refresh"]
-            token = RefreshToken(refresh_token)
+            token = RevocableRefreshToken(refresh_token)
             token.blacklist()
             return Response({"detail": "Logout successful"}, status=status.HTTP_205_RESET_CONTENT)
         except Exception as e:
@@ -118,15 +158,7 @@ def add_to_watchlist(request):
     if not movie_id:
         return Response({"error": "movie_id is required"}, status=400)
 
-    watch_item, created = Watchlist.objects.get_or_create(
-        user=request.user,
-        movie_id=movie_id,
-        defaults={'status': status_choice}
-    )
-
-    if not created:
-        watch_item.status = status_choice
-        watch_item.save()
+    watch_item = upsert_library_row(Watchlist, request.user.id, movie_id, status=status_choice)
 
     serializer = WatchlistSerializer(watch_item)
     return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -135,11 +167,32 @@ def add_to_watchlist(request):
 @permission_classes([IsAuthenticated])
 def get_watchlist(request):
     """
-    Get all movies in the user's watchlist.
+    Get the movies in the user's watchlist, newest first, one page at a time.
+    Query parameters (all optional):
+    - page_size: rows per page
+    - cursor: the "next" value of the previous page
+    - status: only rows with this status
+    - created_after / created_before: ISO date or datetime bounds on created_at
+    - expand=movie: embed each movie's summary
+    Response: {"results": [...], "next": "<cursor>" | null}
+    Responses carry an ETag; send it back in If-None-Match to get a 304
+    while the library is unchanged.
     """
-    watchlist = Watchlist.objects.filter(user=request.user)
-    serializer = WatchlistSerializer(watchlist, many=True)
-    return Response(serializer.data)
+    watchlist = Watchlist.objects.filter(user=request.user.id)
+
+    status_choice = request.query_params.get('status')
+    if status_choice:
+        if status_choice not in dict(Watchlist.STATUS_CHOICES):
+            return Response({"error": "Invalid status"}, status=status.HTTP_400_BAD_REQUEST)
+        watchlist = watchlist.filter(status=status_choice)
+    created_after = parse_datetime_param(request, 'created_after')
+    if created_after:
+        watchlist = watchlist.filter(created_at__gte=created_after)
+    created_before = parse_datetime_param(request, 'created_before', end_of_day=True)
+    if created_before:
+        watchlist = watchlist.filter(created_at__lte=created_before)
+
+    return library_list_response(request, watchlist, WatchlistSerializer)
 
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
@@ -147,12 +200,26 @@ def delete_from_watchlist(request, movie_id):
     """
     Delete a movie from the user's watchlist by movie_id
     """
-    try:
-        watch_item = Watchlist.objects.get(user=request.user, movie_id=movie_id)
-        watch_item.delete()
-        return Response({"message": "Movie removed from watchlist"}, status=status.HTTP_200_OK)
-    except Watchlist.DoesNotExist:
+    if not remove_library_row(Watchlist, request.user.id, movie_id):
         return Response({"error": "Movie not found in watchlist"}, status=status.HTTP_404_NOT_FOUND)
+    return Response({"message": "Movie removed from watchlist"}, status=status.HTTP_200_OK)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_watchlist(request):
+    """
+    Add or remove many movies in the user's watchlist in one transaction.
+    Request body:
+    {
+        "items": [
+            {"movie_id": "123", "op": "add", "status": "watching"},
+            {"movie_id": "456", "op": "remove"}
+        ]
+    }
+    Response: {"results": [{"movie_id": "123", "result": "created"}, ...]}
+    where result is created, updated, removed, not_found or error.
+    """
+    return bulk_response(request, Watchlist, watchlist_fields)
 
 #! ------------------Favorite endpoints------------------
 
@@ -170,10 +237,7 @@ def add_favorite(request):
     if not movie_id:
         return Response({"error": "movie_id is required"}, status=400)
 
-    favorite, created = Favorite.objects.get_or_create(
-        user=request.user,
-        movie_id=movie_id
-    )
+    favorite = upsert_library_row(Favorite, request.user.id, movie_id)
 
     serializer = FavoriteSerializer(favorite)
     return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -182,11 +246,12 @@ def add_favorite(request):
 @permission_classes([IsAuthenticated])
 def get_favorites(request):
     """
-    Get all movies in the user's favorites.
+    Get the movies in the user's favorites, newest first, one page at a time.
+    Query parameters (all optional): page_size, cursor, expand=movie.
+    Response: {"results": [...], "next": "<cursor>" | null}
     """
-    favorites = Favorite.objects.filter(user=request.user)
-    serializer = FavoriteSerializer(favorites, many=True)
-    return Response(serializer.data)
+    favorites = Favorite.objects.filter(user=request.user.id)
+    return library_list_response(request, favorites, FavoriteSerializer)
 
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
@@ -194,12 +259,26 @@ def delete_favorite(request, movie_id):
     """
     Delete a movie from the user's favorites by movie_id.
     """
-    try:
-        favorite = Favorite.objects.get(user=request.user, movie_id=movie_id)
-        favorite.delete()
-        return Response({"message": "Movie removed from favorites"}, status=status.HTTP_200_OK)
-    except Favorite.DoesNotExist:
+    if not remove_library_row(Favorite, request.user.id, movie_id):
         return Response({"error": "Movie not found in favorites"}, status=status.HTTP_404_NOT_FOUND)
+    return Response({"message": "Movie removed from favorites"}, status=status.HTTP_200_OK)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_favorites(request):
+    """
+    Add or remove many movies in the user's favorites in one transaction.
+    Request body:
+    {
+        "items": [
+            {"movie_id": "123", "op": "add"},
+            {"movie_id": "456", "op": "remove"}
+        ]
+    }
+    Response: {"results": [{"movie_id": "123", "result": "created"}, ...]}
+    where result is created, updated, removed, not_found or error.
+    """
+    return bulk_response(request, Favorite)
 
 #! ------------------WatchedHistory endpoints------------------
 
@@ -217,10 +296,7 @@ def add_WatchedHistory(request):
     if not movie_id:
         return Response({"error": "movie_id is required"}, status=status.HTTP_400_BAD_REQUEST)
 
-    watchedhistory, created = WatchedHistory.objects.get_or_create(
-        user=request.user,
-        movie_id=movie_id,
-    )
+    watchedhistory = upsert_library_row(WatchedHistory, request.user.id, movie_id)
 
     serializer = WatchedHistorySerializer(watchedhistory)
     return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -231,11 +307,12 @@ def add_WatchedHistory(request):
 @permission_classes([IsAuthenticated])
 def get_WatchedHistory(request):
     """
-    Get all movies in the user's watched history.
+    Get the movies in the user's watched history, newest first, one page at a time.
+    Query parameters (all optional): page_size, cursor, expand=movie.
+    Response: {"results": [...], "next": "<cursor>" | null}
     """
-    watchedhistory = WatchedHistory.objects.filter(user=request.user)
-    serializer = WatchedHistorySerializer(watchedhistory, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    watchedhistory = WatchedHistory.objects.filter(user=request.user.id)
+    return library_list_response(request, watchedhistory, WatchedHistorySerializer)
 
 
 
@@ -245,12 +322,26 @@ def delete_WatchedHistory(request, movie_id):
     """
     Delete a movie from the user's watched history by movie_id.
     """
-    try:
-        watchedhistory = WatchedHistory.objects.get(user=request.user, movie_id=movie_id)
-        watchedhistory.delete()
-        return Response({"message": "Movie removed from WatchedHistory"}, status=status.HTTP_200_OK)
-    except WatchedHistory.DoesNotExist:
+    if not remove_library_row(WatchedHistory, request.user.id, movie_id):
         return Response({"error": "Movie not found in WatchedHistory"}, status=status.HTTP_404_NOT_FOUND)
+    return Response({"message": "Movie removed from WatchedHistory"}, status=status.HTTP_200_OK)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_WatchedHistory(request):
+    """
+    Add or remove many movies in the user's watched history in one transaction.
+    Request body:
+    {
+        "items": [
+            {"movie_id": "123", "op": "add"},
+            {"movie_id": "456", "op": "remove"}
+        ]
+    }
+    Response: {"results": [{"movie_id": "123", "result": "created"}, ...]}
+    where result is created, updated, removed, not_found or error.
+    """
+    return bulk_response(request, WatchedHistory)
+
 #! ------------------preference endpoints------------------
 
 @api_view(['POST'])
@@ -278,10 +369,7 @@ def set_preference(request):
     elif disliked:
         liked = False
 
-    pref, _ = UserPreference.objects.get_or_create(user=request.user, movie_id=movie_id)
-    pref.liked = liked
-    pref.disliked = disliked
-    pref.save()
+    pref = upsert_library_row(UserPreference, request.user.id, movie_id, liked=liked, disliked=disliked)
 
     return Response({
         "message": "Preferences updated",
@@ -290,167 +378,297 @@ def set_preference(request):
         "disliked": pref.disliked
     })
 
-@api_view(['GET'])
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def user_preferences(request):
+    """
+    GET: list the user's preferences, newest first, one page at a time.
+    Query parameters (all optional): page_size, cursor, expand=movie.
+    Response: {"results": [...], "next": "<cursor>" | null}
+
+    DELETE: clear all of the user's preferences.
+    """
+    preferences = UserPreference.objects.filter(user=request.user.id)
+    if request.method == 'GET':
+        return library_list_response(request, preferences, UserPreferenceSerializer)
+
+    with transaction.atomic():
+        movie_ids = list(preferences.values_list('movie_id', flat=True))
+        preferences.delete()
+        if movie_ids:
+            library_changed(UserPreference, request.user.id, movie_ids)
+    return Response({"message": "Preferences deleted successfully", "deleted": len(movie_ids)})
+
+@api_view(['GET', 'DELETE'])
 @permission_classes([IsAuthenticated])
-def get_user_preferences(request):
+def user_preference(request, movie_id):
     """
-    Retrieve the current user's preferences.
+    GET: the user's preference for one movie.
+    DELETE: clear the user's preference for one movie.
     """
+    if request.method == 'DELETE':
+        if not remove_library_row(UserPreference, request.user.id, movie_id):
+            return Response({"error": "Preference not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"message": "Preference deleted successfully"})
+
     try:
-        pref = UserPreference.objects.get(user=request.user)
-        serializer = UserPreferenceSerializer(pref)
-        return Response(serializer.data)
+        with replica_reads(request.user.id):
+            pref = UserPreference.objects.get(user=request.user.id, movie_id=movie_id)
     except UserPreference.DoesNotExist:
-        return Response({"error": "Preferences not found"}, status=404)
+        return Response({"error": "Preference not found"}, status=status.HTTP_404_NOT_FOUND)
+    return Response(UserPreferenceSerializer(pref).data)
 
-@api_view(['DELETE'])
+@api_view(['GET'])
 @permission_classes([IsAuthenticated])
-def delete_user_preferences(request):
+def get_preference_ids(request):
     """
-    Delete the current user's preferences.
+    Get the ids of the movies the user liked and disliked, for
+    decorating movie cards. Cached until the user's next library write.
+    Response: {"liked": ["123", ...], "disliked": ["456", ...]}
     """
-    try:
-        pref = UserPreference.objects.get(user=request.user)
-        pref.delete()
-        return Response({"message": "Preferences deleted successfully"})
-    except UserPreference.DoesNotExist:
-        return Response({"error": "Preferences not found"}, status=404)
+    return Response(preference_ids(request.user.id))
 
-#! ------------------ endpoints------------------
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_preferences(request):
+    """
+    Set or clear the preferences (liked/disliked) of many movies in one transaction.
+    Request body:
+    {
+        "items": [
+            {"movie_id": "123", "op": "add", "liked": true},
+            {"movie_id": "456", "op": "remove"}
+        ]
+    }
+    Response: {"results": [{"movie_id": "123", "result": "created"}, ...]}
+    where result is created, updated, removed, not_found or error.
+    """
+    return bulk_response(request, UserPreference, preference_fields)
+
+#! ------------------library state endpoint------------------
 
 @api_view(['GET'])
-def get_movie_by_id(request, movie_id):
-    url = f"https://api.themoviedb.org/3/movie/{movie_id}?api_key={settings.TMDB_API_KEY}"
-    headers = {
-        "Authorization": f"Bearer {settings.TMDB_READ_ACCESS_TOKEN}",
-        "Content-Type": "application/json;charset=utf-8"
+@permission_classes([IsAuthenticated])
+def get_library_state(request):
+    """
+    Get the library state of many movies at once, to decorate a grid.
+    Query parameters:
+    - ids: comma-separated movie ids (required)
+    Response:
+    {
+        "flags": {"watchlist": 1, "favorite": 2, "watched": 4, "liked": 8, "disliked": 16},
+        "states": {"<movie id>": <sum of the flags that apply>, ...}
     }
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
-        return Response(response.json())
-    else:
-        return Response({"error": "Movie not found"}, status=response.status_code)
+    """
+    movie_ids = {movie_id.strip() for movie_id in request.query_params.get('ids', '').split(',') if movie_id.strip()}
+    if not movie_ids:
+        return Response({"error": "ids is required"}, status=status.HTTP_400_BAD_REQUEST)
+    if len(movie_ids) > settings.LIBRARY_STATE_MAX_IDS:
+        return Response(
+            {"error": f"At most {settings.LIBRARY_STATE_MAX_IDS} ids per request"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return Response({"flags": STATE_FLAGS, "states": library_state(request.user.id, movie_ids)})
 
+#! ------------------ endpoints------------------
+#! The TMDb-bound views are plain async Django views (DRF views cannot be
+#! async): they await TMDb through core.tmdb_async instead of holding a
+#! worker thread, and run the ORM parts with sync_to_async.
 
+def _json_response(data, status=status.HTTP_200_OK):
+    """
+    JSON response for the async views, encoded like the DRF views.
+    """
+    return HttpResponse(ORJSONRenderer().render(data), status=status, content_type="application/json")
 
+@require_GET
+async def get_movie_by_id(request, movie_id):
+    """
+    Get a movie from TMDb by id.
+    Pass ?detailed=true to get the same payload as /movies/popular/
+    (details, top cast and trailer) built from a single TMDb call.
+    """
+    detailed = request.GET.get('detailed', '').lower() in ('1', 'true', 'yes')
+    try:
+        if detailed:
+            movie = await tmdb_async.fetch_movie_details(movie_id)
+            await sync_to_async(remember_movies)([movie])
+            return _json_response(movie)
+        details = await tmdb_async.tmdb_get(f"/movie/{movie_id}")
+        await sync_to_async(remember_movies)([format_movie(details)])
+        return _json_response(details)
+    except httpx.HTTPStatusError as e:
+        return _json_response({"error": "Movie not found"}, status=e.response.status_code)
+    except httpx.HTTPError as e:
+        return _json_response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-# @api_view(['POST'])
-# @permission_classes([IsAuthenticated])
-# def get_gemini_recommendations(request):
-#     user = request.user
-    
-#     liked_movies = list(Favorite.objects.filter(user=user).values_list('movie_id', flat=True))
-#     disliked_movies = list(UserPreference.objects.filter(user=user, disliked=True).values_list('movie_id', flat=True))
-#     watchlist_movies = list(Watchlist.objects.filter(user=user).values_list('movie_id', flat=True))
-    
-#     prompt = f"""
-#     User likes these movies: {liked_movies}
-#     User dislikes these movies: {disliked_movies}
-#     User watchlist: {watchlist_movies}
-    
-#     Suggest 5 movies this user will likely enjoy.
-#     """
-    
-#     headers = {
-#         "Authorization": f"Bearer {settings.GEMINI_API_KEY}",
-#         "Content-Type": "application/json"
-#     }
-    
-#     response = requests.post(
-#         settings.GEMINI_API_URL,
-#         json={"prompt": prompt, "max_results": 5},
-#         headers=headers
-#     )
-    
-#     if response.status_code != 200:
-#         return Response({"error": "Gemini API request failed"}, status=response.status_code)
-    
-#     recommendations = response.json().get("recommendations", [])
-    
-#     # Save & serialize
-#     saved_recommendations = []
-#     for movie_id in recommendations:
-#         rec, created = Recommendation.objects.get_or_create(user=user, movie_id=movie_id)
-#         saved_recommendations.append(rec)
 
-#     serializer = RecommendationSerializer(saved_recommendations, many=True)
-#     return Response(serializer.data)
 
 
+@api_view(['GET'])
+def get_similar_movies(request, movie_id):
+    """
+    Get movies similar to movie_id from the local content-based index
+    (genres, cast, rating and year; see core.similarity). Only the index
+    and the Movie table are read: no TMDb call is made, not even to
+    refresh stale rows (refresh_movie_metadata does that), so it also
+    works for users without any history.
+    Query parameters:
+    - limit: number of movies (default 10, max SIMILARITY_NEIGHBOURS)
+    """
+    try:
+        limit = max(1, min(int(request.query_params.get('limit', 10)), settings.SIMILARITY_NEIGHBOURS))
+    except ValueError:
+        return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
 
+    similar = similar_movies(movie_id, limit)
+    if similar is None:
+        return Response({"error": "Movie not found in the similarity index"}, status=status.HTTP_404_NOT_FOUND)
 
-import requests
-from django.conf import settings
-from rest_framework.views import APIView
-from rest_framework.response import Response
-from rest_framework import status
+    movies = get_movies([similar_id for similar_id, _ in similar], refresh_stale=False)
+    return Response([
+        {**movie_summary(movies[similar_id]), "score": score}
+        for similar_id, score in similar
+        if similar_id in movies
+    ])
+
+
+#! ------------------recommendation endpoints------------------
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_recommendations(request):
+    """
+    Get the user's precomputed recommendations, best first.
+    They are built locally from library activity (see core.recommender
+    and the build_recommendations command).
+    Pass ?expand=movie to embed each movie's summary.
+    """
+    recommendations = Recommendation.objects.filter(user=request.user.id).order_by('-score')
+    serializer = values_serializer(RecommendationSerializer)
+    data = serializer.data(list(serializer.rows(recommendations)))
+    if wants_movie_expansion(request):
+        data = expand_movies(data)
+    return Response(data)
+
+
+def _ndjson_line(data):
+    return ORJSONRenderer().render(data) + b"\n"
+
+
+def _iter_ndjson(movies):
+    """
+    Encode detailed movies as NDJSON lines. An upstream error ends the
+    stream with an {"error": ...} line since the status is already sent.
+    """
+    sent = []
+    try:
+        for movie in iter_movies_details(movies):
+            sent.append(movie)
+            yield _ndjson_line(movie)
+    except requests.exceptions.RequestException as e:
+        yield _ndjson_line({"error": str(e)})
+    remember_movies(sent)
 
 
-class MoviesWithDetailsView(APIView):
+async def _aiter_ndjson(movies):
+    """
+    Async _iter_ndjson, for requests served over ASGI.
+    """
+    sent = []
+    try:
+        async for movie in tmdb_async.iter_movies_details(movies):
+            sent.append(movie)
+            yield _ndjson_line(movie)
+    except httpx.HTTPError as e:
+        yield _ndjson_line({"error": str(e)})
+    await sync_to_async(remember_movies)(sent)
+
+
+class MoviesWithDetailsView(View):
     """
     API endpoint to fetch 50 movies (popular) with full details including cast, trailer, etc.
     Method: GET
     URL: /movies/popular-detailed/
+
+    Without parameters, serves the pre-built snapshot (see core.snapshot
+    and the refresh_popular_snapshot command) with ETag/Last-Modified
+    headers. If no snapshot exists yet, it is built during this request.
+
+    Optional query parameters:
+    - page, page_size: only fetch and enrich that slice of the popular
+      list (page_size up to 50, default 50). Returns
+      {"page", "page_size", "total_results", "results"}. Pages past
+      the end of the list are empty; pages TMDb cannot serve get a 400.
+    - stream=true: respond with NDJSON, one movie per line, each sent
+      as soon as its details are ready. Under WSGI a response cannot
+      consume an async iterator without buffering it whole, so there
+      the lines come from the threaded client (core.tmdb) instead.
     """
+    max_page_size = POPULAR_SNAPSHOT_SIZE
+
+    async def get(self, request):
+        params = request.GET
+        stream = params.get('stream', '').lower() in ('1', 'true', 'yes')
+        if 'page' not in params and 'page_size' not in params and not stream:
+            return await self.get_snapshot(request)
+
+        try:
+            page = int(params.get('page', 1))
+            page_size = int(params.get('page_size', self.max_page_size))
+        except ValueError:
+            return _json_response({"error": "page and page_size must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+        if page < 1 or not 1 <= page_size <= self.max_page_size:
+            return _json_response(
+                {"error": f"page must be >= 1 and page_size between 1 and {self.max_page_size}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if (page - 1) * page_size >= TMDB_MAX_PAGE * TMDB_PAGE_SIZE:
+            return _json_response({"error": "page is out of range"}, status=status.HTTP_400_BAD_REQUEST)
 
-    def get(self, request):
         try:
-            # Step 1: Get popular movies (first 3 pages = ~60 movies)
-            movies = []
-            for page in range(1, 4):  # fetch 3 pages (20 each)
-                url = f"https://api.themoviedb.org/3/movie/popular?api_key={settings.TMDB_API_KEY}&language=en-US&page={page}"
-                response = requests.get(url)
-                response.raise_for_status()
-                movies.extend(response.json().get("results", []))
-
-            detailed_movies = []
-
-            # Step 2: For each movie, fetch details, credits, and trailers
-            for movie in movies[:50]:  # limit to 50
-                movie_id = movie["id"]
-
-                # Movie details
-                details_url = f"https://api.themoviedb.org/3/movie/{movie_id}?api_key={settings.TMDB_API_KEY}&language=en-US"
-                details = requests.get(details_url).json()
-
-                # Credits (cast)
-                credits_url = f"https://api.themoviedb.org/3/movie/{movie_id}/credits?api_key={settings.TMDB_API_KEY}&language=en-US"
-                credits = requests.get(credits_url).json()
-                cast = [
-                    {
-                        "id": c["id"],
-                        "name": c["name"],
-                        "character": c.get("character"),
-                        "image": f"https://image.tmdb.org/t/p/w200{c['profile_path']}" if c.get("profile_path") else None
-                    }
-                    for c in credits.get("cast", [])[:5]  # top 5 cast members
-                ]
-
-                # Videos (trailers)
-                videos_url = f"https://api.themoviedb.org/3/movie/{movie_id}/videos?api_key={settings.TMDB_API_KEY}&language=en-US"
-                videos = requests.get(videos_url).json()
-                trailer = None
-                for v in videos.get("results", []):
-                    if v["site"] == "YouTube" and v["type"] == "Trailer":
-                        trailer = f"https://www.youtube.com/embed/{v['key']}"
-                        break
-
-                # Step 3: Format JSON response
-                detailed_movies.append({
-                    "id": details["id"],
-                    "title": details["title"],
-                    "releaseDate": details.get("release_date"),
-                    "rating": details.get("vote_average"),
-                    "runtime": details.get("runtime"),
-                    "genres": [g["name"] for g in details.get("genres", [])],
-                    "overview": details.get("overview"),
-                    "poster": f"https://image.tmdb.org/t/p/w500{details['poster_path']}" if details.get("poster_path") else None,
-                    "backdrop": f"https://image.tmdb.org/t/p/original{details['backdrop_path']}" if details.get("backdrop_path") else None,
-                    "trailer": trailer,
-                    "cast": cast
-                })
-
-            return Response(detailed_movies, status=status.HTTP_200_OK)
-
-        except requests.exceptions.RequestException as e:
-            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            movies, total_results = await tmdb_async.fetch_popular_movies((page - 1) * page_size, page_size)
+            if stream:
+                lines = _aiter_ndjson(movies) if isinstance(request, ASGIRequest) else _iter_ndjson(movies)
+                return StreamingHttpResponse(lines, content_type="application/x-ndjson")
+            results = [movie async for movie in tmdb_async.iter_movies_details(movies)]
+            await sync_to_async(remember_movies)(results)
+        except httpx.HTTPError as e:
+            return _json_response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        return _json_response({
+            "page": page,
+            "page_size": page_size,
+            "total_results": total_results,
+            "results": results
+        })
+
+    async def get_snapshot(self, request):
+        snapshot = await sync_to_async(get_snapshot)(POPULAR_SNAPSHOT)
+        if snapshot is None:
+            try:
+                movies = await tmdb_async.fetch_popular_detailed(limit=POPULAR_SNAPSHOT_SIZE)
+            except httpx.HTTPError as e:
+                return _json_response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            snapshot = await sync_to_async(store_popular_snapshot)(movies)
+
+        etag = f'"{snapshot.etag}"'
+        last_modified = int(snapshot.built_at.timestamp())
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = HttpResponse(snapshot.payload, content_type="application/json")
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        return response
+
+
+#! ------------------metrics endpoint------------------
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_metrics(request):
+    """
+    Operational metrics of this worker process (see core.metrics), e.g.
+    TMDb cache hits and the request coalescing hit ratio. Staff only.
+    """
+    return Response(metrics.snapshot())
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 from pathlib import Path
 
+from decouple import Csv, config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -76,12 +78,61 @@ WSGI_APPLICATION = 'filmhub.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# PostgreSQL, configured from the environment.
+# - DB_CONN_MAX_AGE: seconds a connection is reused across requests
+#   (0 closes it after every request). With DB_CONN_HEALTH_CHECKS a
+#   reused connection is checked before the request that picks it up.
+# - DB_PGBOUNCER: set when connecting through PgBouncer in transaction
+#   pooling mode, which cannot keep server-side cursors open.
+# - DB_POOL: use psycopg 3's connection pool instead of persistent
+#   connections (recommended under ASGI, where each request may run in
+#   a different thread). DB_POOL_TIMEOUT is how long a request waits
+#   for a free connection before failing.
+DB_POOL = config('DB_POOL', default=False, cast=bool)
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': config('DB_NAME', default='filmhub_db'),
+        'USER': config('DB_USER', default='youssef'),
+        'PASSWORD': config('DB_PASSWORD', default=''),
+        'HOST': config('DB_HOST', default='localhost'),
+        'PORT': config('DB_PORT', default='5432'),
+        'CONN_MAX_AGE': 0 if DB_POOL else config('DB_CONN_MAX_AGE', default=60, cast=int),
+        'CONN_HEALTH_CHECKS': config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
+        'DISABLE_SERVER_SIDE_CURSORS': config('DB_PGBOUNCER', default=False, cast=bool),
+        'OPTIONS': {},
     }
 }
+if DB_POOL:
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+        'max_size': config('DB_POOL_MAX_SIZE', default=20, cast=int),
+        'timeout': config('DB_POOL_TIMEOUT', default=10, cast=float),
+    }
+
+# Read replicas for the library read endpoints (core.routers). Every host
+# in DB_REPLICA_HOSTS becomes a "replica_<n>" alias with the primary's
+# other settings. After a library write the user's reads stay on the
+# primary for DB_REPLICA_STICKY_SECONDS, which must exceed the replica lag.
+DATABASE_REPLICAS = []
+for index, host in enumerate(config('DB_REPLICA_HOSTS', default='', cast=Csv())):
+    alias = f'replica_{index}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'OPTIONS': {**DATABASES['default']['OPTIONS']},
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+DB_REPLICA_STICKY_SECONDS = config('DB_REPLICA_STICKY_SECONDS', default=5, cast=int)
+
+
+AUTHENTICATION_BACKENDS = [
+    # username or email, one indexed lookup and one password hash per login
+    'core.backends.UsernameOrEmailBackend',
+]
 
 
 # Password validation
@@ -125,21 +176,14 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'filmhub_db',
-        'USER': 'youssef',
-        'PASSWORD': 'youssef3092004',
-        'HOST': 'localhost',
-        'PORT': '5432',
-    }
-}
-
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 }
 
 from datetime import timedelta
@@ -151,9 +195,93 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': True,
 }
 
-from decouple import config
-
 TMDB_API_KEY = config('API_KEY')
 TMDB_READ_ACCESS_TOKEN = config('ACCESS_TOKEN')
 GEMINI_API_KEY=config('GEMINI_API_KEY')
 GEMINI_API_URL=config('GEMINI_API_URL')
+
+# Stateless JWT authentication: build request.user from the access
+# token's claims instead of loading the User row on every request. Only
+# is_active, is_staff and is_superuser are read from the database, cached
+# for JWT_ACTIVE_CACHE_TTL seconds.
+JWT_STATELESS_AUTH = config('JWT_STATELESS_AUTH', default=False, cast=bool)
+JWT_ACTIVE_CACHE_TTL = config('JWT_ACTIVE_CACHE_TTL', default=60, cast=int)
+if JWT_STATELESS_AUTH:
+    REST_FRAMEWORK['DEFAULT_AUTHENTICATION_CLASSES'] = (
+        'core.authentication.StatelessJWTAuthentication',
+    )
+
+# Refresh token revocation checks (core.tokens): a per-process Bloom
+# filter of blacklisted jtis, topped up every SYNC_INTERVAL seconds and
+# rebuilt every REBUILD_INTERVAL seconds. Recent revocations are shared
+# through CACHES; with a process-local cache every check reads the database.
+JWT_REVOCATION_SYNC_INTERVAL = config('JWT_REVOCATION_SYNC_INTERVAL', default=5, cast=int)
+JWT_REVOCATION_REBUILD_INTERVAL = config('JWT_REVOCATION_REBUILD_INTERVAL', default=60 * 60, cast=int)
+JWT_BLOOM_MIN_CAPACITY = config('JWT_BLOOM_MIN_CAPACITY', default=10000, cast=int)
+JWT_BLOOM_ERROR_RATE = config('JWT_BLOOM_ERROR_RATE', default=0.001, cast=float)
+
+# TMDb fan-out: max concurrent upstream calls per request
+TMDB_MAX_WORKERS = config('TMDB_MAX_WORKERS', default=10, cast=int)
+
+# TMDb HTTP client: connection pool, timeouts (seconds), retries on
+# 429/5xx and a client-side rate limit shared by all threads
+TMDB_POOL_SIZE = config('TMDB_POOL_SIZE', default=20, cast=int)
+TMDB_CONNECT_TIMEOUT = config('TMDB_CONNECT_TIMEOUT', default=3.05, cast=float)
+TMDB_READ_TIMEOUT = config('TMDB_READ_TIMEOUT', default=10, cast=float)
+TMDB_RETRIES = config('TMDB_RETRIES', default=3, cast=int)
+TMDB_RETRY_BACKOFF = config('TMDB_RETRY_BACKOFF', default=0.5, cast=float)
+TMDB_RETRY_AFTER_MAX = config('TMDB_RETRY_AFTER_MAX', default=10, cast=float)
+TMDB_RATE_LIMIT = config('TMDB_RATE_LIMIT', default=40, cast=float)
+TMDB_RATE_BURST = config('TMDB_RATE_BURST', default=40, cast=int)
+
+# Async TMDb client (httpx) used by the async views: max open
+# connections per event loop. Timeouts, retries and the rate limit are
+# the ones above.
+TMDB_ASYNC_MAX_CONNECTIONS = config('TMDB_ASYNC_MAX_CONNECTIONS', default=100, cast=int)
+
+# TMDb response cache. BACKEND is 'locmem' (per-process LRU bounded by
+# MAX_BYTES) or 'redis', which needs the redis package (not in
+# requirements.txt). TTLs are in seconds; 0 disables caching.
+TMDB_CACHE = {
+    'BACKEND': config('TMDB_CACHE_BACKEND', default='locmem'),
+    'REDIS_URL': config('TMDB_CACHE_REDIS_URL', default='redis://localhost:6379/1'),
+    'MAX_BYTES': config('TMDB_CACHE_MAX_BYTES', default=64 * 1024 * 1024, cast=int),
+    'TTLS': {
+        'popular': config('TMDB_CACHE_TTL_POPULAR', default=300, cast=int),
+        'movie': config('TMDB_CACHE_TTL_MOVIE', default=24 * 60 * 60, cast=int),
+        'default': config('TMDB_CACHE_TTL_DEFAULT', default=60 * 60, cast=int),
+    },
+}
+
+# Local Movie metadata rows older than this (seconds) are refreshed from TMDb
+MOVIE_METADATA_TTL = config('MOVIE_METADATA_TTL', default=7 * 24 * 60 * 60, cast=int)
+
+# Content-based similar movies index (see core/similarity.py)
+SIMILARITY_INDEX_DIR = config('SIMILARITY_INDEX_DIR', default=str(BASE_DIR / 'var' / 'similarity'))
+SIMILARITY_NEIGHBOURS = config('SIMILARITY_NEIGHBOURS', default=50, cast=int)
+
+# Cursor pagination of the watchlist, favorites and history lists
+LIBRARY_PAGE_SIZE = config('LIBRARY_PAGE_SIZE', default=50, cast=int)
+LIBRARY_MAX_PAGE_SIZE = config('LIBRARY_MAX_PAGE_SIZE', default=500, cast=int)
+# Max items accepted by the bulk add/remove endpoints
+LIBRARY_MAX_BULK_ITEMS = config('LIBRARY_MAX_BULK_ITEMS', default=500, cast=int)
+# Max movie ids per /library/state/ request
+LIBRARY_STATE_MAX_IDS = config('LIBRARY_STATE_MAX_IDS', default=500, cast=int)
+# Cached per-user library payloads are also invalidated on every write
+LIBRARY_CACHE_TIMEOUT = config('LIBRARY_CACHE_TIMEOUT', default=15 * 60, cast=int)
+
+# Shared cache used for per-user library payloads, the is_active cache
+# and recent token revocations. Point it at Redis or Memcached in
+# production so all workers see the same invalidations; with the
+# process-local default the library caches are bypassed (check core.W001).
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='filmhub'),
+    }
+}
+
+# Recommendations stored per user by the local recommender
+RECOMMENDATIONS_TOP_N = config('RECOMMENDATIONS_TOP_N', default=20, cast=int)
+# Interaction and co-occurrence matrices kept between incremental updates
+RECOMMENDER_STATE_PATH = config('RECOMMENDER_STATE_PATH', default=str(BASE_DIR / 'var' / 'recommender_state.npz'))